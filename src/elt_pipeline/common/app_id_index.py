@@ -0,0 +1,70 @@
+'''Index of the app_ids already uploaded for each store, kept as one small
+sorted parquet file so the extract pipelines don't read the app_id
+column of every file in the store's dataset on each run. Other columns
+can be indexed the same way, each in its own file.
+Copied next to each pipeline's handler when its image is built.'''
+import logging
+import awswrangler as wr
+import boto3
+import pandas as pd
+
+INDEX_PREFIX = "index"
+
+
+def get_index_dir(dataset_path: str) -> str:
+    '''Gets where the indexes of a store's dataset are kept, outside its
+    prefix so the TL pipeline never reads them as game data,
+    e.g. s3://bucket/input/steam -> s3://bucket/index/steam/'''
+    bucket, _, prefix = dataset_path.removeprefix('s3://').partition('/')
+    store = prefix.strip('/').rsplit('/', 1)[-1]
+    return f"s3://{bucket}/{INDEX_PREFIX}/{store}/"
+
+
+def get_index_path(dataset_path: str, column: str = 'app_id') -> str:
+    '''Gets where the index of a column of a store's dataset is kept,
+    e.g. s3://bucket/input/steam -> s3://bucket/index/steam/app_ids.parquet'''
+    return f"{get_index_dir(dataset_path)}{column}s.parquet"
+
+
+def write_app_id_index(dataset_path: str, app_ids: set[str],
+                       session: boto3.Session, column: str = 'app_id'):
+    '''Overwrites the store's index with the given app_ids, sorted'''
+    wr.s3.to_parquet(pd.DataFrame({column: sorted(app_ids)}),
+                     get_index_path(dataset_path, column), index=False,
+                     boto3_session=session)
+
+
+def get_indexed_app_ids(dataset_path: str, session: boto3.Session,
+                        column: str = 'app_id') -> set[str]:
+    '''Reads the store's index, building it from the whole dataset the
+    first time it is missing. Returns an empty set only when the store has
+    no data yet; any other read error is raised, as writing an index built
+    from an empty set would drop every game already stored'''
+    index_path = get_index_path(dataset_path, column)
+    try:
+        df = wr.s3.read_parquet(index_path, columns=[column],
+                                boto3_session=session)
+        return set(df[column].astype(str))
+    except wr.exceptions.NoFilesFound:
+        logging.info("No %s index at %s, building it from %s",
+                     column, index_path, dataset_path)
+    # Read as plain files, as files written before the ingest_date
+    # partition was added are at a different depth
+    try:
+        df = wr.s3.read_parquet(dataset_path, columns=[column],
+                                path_suffix='.parquet', boto3_session=session)
+    except wr.exceptions.NoFilesFound:
+        logging.info("No data at %s yet", dataset_path)
+        return set()
+    app_ids = set(df[column].astype(str))
+    write_app_id_index(dataset_path, app_ids, session, column)
+    return app_ids
+
+
+def add_to_app_id_index(dataset_path: str, existing_app_ids: set[str],
+                        new_app_ids, session: boto3.Session,
+                        column: str = 'app_id'):
+    '''Adds newly uploaded games' app_ids to the store's index'''
+    app_ids = existing_app_ids | {str(app_id) for app_id in new_app_ids}
+    if len(app_ids) > len(existing_app_ids):
+        write_app_id_index(dataset_path, app_ids, session, column)
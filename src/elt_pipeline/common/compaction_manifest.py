@@ -0,0 +1,91 @@
+'''Manifest of the compacted files in each store's S3 dataset.
+The compaction job merges a partition's small parquet files into one,
+records here which files it replaced, then deletes them. Readers use
+the manifest to skip replaced files that are not deleted yet and
+compacted files that are not recorded yet, so no rows are read twice.
+The manifest is sharded by ingest_date partition, so readers only fetch
+the shards of the days they list and no shard grows past one day's files.
+Copied next to each handler that reads the datasets when its image is built.'''
+import json
+import posixpath
+import re
+import boto3
+from app_id_index import get_index_dir
+
+COMPACTED_PREFIX = "compacted-"
+MANIFEST_NAME = "compaction_manifest.json"
+MANIFEST_DIR = "compaction_manifest/"
+INGEST_DATE_PATTERN = re.compile(r'/ingest_date=([^/]+)/')
+
+
+def split_s3_path(path: str) -> tuple[str, str]:
+    '''Splits an s3:// path into its bucket and key'''
+    bucket, _, key = path.removeprefix('s3://').partition('/')
+    return bucket, key
+
+
+def get_ingest_date(path: str) -> str | None:
+    '''Gets the ingest_date partition a file is in, or None
+    for files uploaded before the datasets were partitioned by it'''
+    match = INGEST_DATE_PATTERN.search(path)
+    return match.group(1) if match else None
+
+
+def get_manifest_path(dataset_path: str, ingest_date: str | None = None) -> str:
+    '''Gets where the shard of a store's compaction manifest covering one
+    ingest_date partition is kept, or the files outside any of them'''
+    if ingest_date is None:
+        return get_index_dir(dataset_path) + MANIFEST_NAME
+    return f"{get_index_dir(dataset_path)}{MANIFEST_DIR}ingest_date={ingest_date}.json"
+
+
+def read_compaction_manifest(dataset_path: str,
+                             session: boto3.Session | None = None,
+                             ingest_date: str | None = None) -> dict[str, list[str]]:
+    '''Reads the {compacted file: [files it replaced]} manifest of one
+    ingest_date partition of a store's dataset, which is empty before
+    any of its files are compacted'''
+    client = (session or boto3).client('s3')
+    bucket, key = split_s3_path(get_manifest_path(dataset_path, ingest_date))
+    try:
+        body = client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    except client.exceptions.NoSuchKey:
+        return {}
+    return json.loads(body)
+
+
+def read_compaction_manifests(dataset_path: str, objects: list[str],
+                              session: boto3.Session | None = None) -> dict[str, list[str]]:
+    '''Reads and merges the manifest shards of every
+    ingest_date partition the listed files are in'''
+    manifest = {}
+    for ingest_date in sorted({get_ingest_date(path) for path in objects},
+                              key=lambda day: day or ''):
+        manifest |= read_compaction_manifest(dataset_path, session, ingest_date)
+    return manifest
+
+
+def write_compaction_manifest(dataset_path: str, manifest: dict[str, list[str]],
+                              session: boto3.Session | None = None,
+                              ingest_date: str | None = None):
+    '''Replaces the manifest shard of one ingest_date partition
+    of a store's dataset in a single PUT'''
+    client = (session or boto3).client('s3')
+    bucket, key = split_s3_path(get_manifest_path(dataset_path, ingest_date))
+    client.put_object(Bucket=bucket, Key=key,
+                      Body=json.dumps(manifest, sort_keys=True).encode(),
+                      ContentType='application/json')
+
+
+def is_compacted_object(path: str) -> bool:
+    '''Checks if a file was written by the compaction job'''
+    return posixpath.basename(path).startswith(COMPACTED_PREFIX)
+
+
+def get_live_objects(objects: list[str], manifest: dict[str, list[str]]) -> list[str]:
+    '''Drops files a recorded compaction has replaced, and compacted
+    files whose compaction was never recorded, from a listing'''
+    replaced = {source for sources in manifest.values() for source in sources}
+    return [path for path in objects
+            if path not in replaced
+            and (path in manifest or not is_compacted_object(path))]
@@ -0,0 +1,27 @@
+'''HTML parsing shared by the Steam and GOG scrapers.
+Pages are parsed with lxml when it is installed, falling back to
+Python's html.parser, and only the tags a scraper asks for are built.
+Copied next to each pipeline's handler when its image is built.'''
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # pylint: disable=unused-import
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+
+def make_soup(html: str, only: SoupStrainer | None = None,
+              parser: str | None = None) -> BeautifulSoup:
+    '''Parses html with the fastest available parser, building only
+    the tags matched by `only`, and everything inside them, if given'''
+    return BeautifulSoup(html, parser or HTML_PARSER, parse_only=only)
+
+
+def class_strainer(*class_names: str) -> SoupStrainer:
+    '''Matches tags with any of the given classes. The class attribute
+    is still one string while parsing, so each name is matched as a
+    whole word within it'''
+    names = '|'.join(re.escape(name) for name in class_names)
+    return SoupStrainer(class_=re.compile(rf'(^|\s)({names})(\s|$)'))
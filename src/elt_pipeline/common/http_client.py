@@ -0,0 +1,281 @@
+'''HTTP client shared by the Steam, GOG and Epic extract pipelines.
+Sessions keep connections alive in a pool per host, ask for compressed
+responses and apply the same timeouts to every request. Responses can
+be cached on disk and revalidated with conditional GETs once stale.
+Copied next to each pipeline's handler when its image is built.'''
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds to connect and to wait for each read
+HTTP_TIMEOUT = (5, 20)
+# Hosts to keep pools for, and connections kept alive per host
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 20
+HTTP_HEADERS = {'Accept-Encoding': 'gzip, deflate'}
+
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+
+# /tmp survives between warm invocations of a lambda
+CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', '/tmp/http_cache')
+# Entries not refreshed for this many seconds are evicted, then the least
+# recently refreshed until the cache fits in the byte cap
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+CACHE_STATS = {'hits': 0, 'revalidated': 0, 'misses': 0}
+CACHE_STATS_LOCK = threading.Lock()
+
+
+def configure_session(session: requests.Session) -> requests.Session:
+    '''Applies the shared pool sizes, compression and default
+    timeout to a session, keeping its existing adapters'''
+    for adapter in session.adapters.values():
+        adapter.init_poolmanager(POOL_CONNECTIONS, POOL_MAXSIZE)
+    session.headers.update(HTTP_HEADERS)
+
+    send_request = session.request
+
+    def request_with_timeout(method, url, **kwargs):
+        kwargs.setdefault('timeout', HTTP_TIMEOUT)
+        return send_request(method, url, **kwargs)
+
+    session.request = request_with_timeout
+    return session
+
+
+def get_http_session() -> requests.Session:
+    '''Creates a session with the shared connection pooling,
+    compression and timeout settings'''
+    session = requests.Session()
+    for prefix in ('https://', 'http://'):
+        session.mount(prefix, HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                                          pool_maxsize=POOL_MAXSIZE))
+    return configure_session(session)
+
+
+HTTP_SESSION = get_http_session()
+
+
+def get_html(url: str, cache_ttl: float | None = None) -> str:
+    """
+    Gets the html content of the webpage at a given url,
+    through the response cache if given a TTL in seconds
+    """
+    if cache_ttl is None:
+        response = HTTP_SESSION.get(url)
+    else:
+        response = get_cached(url, cache_ttl)
+    response.raise_for_status()
+    return response.content.decode("utf_8")
+
+
+class TokenBucket:
+    '''Thread-safe token bucket allowing `capacity` requests
+    in a burst, refilled evenly over `period` seconds'''
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''Blocks until a token is available, then takes it'''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_with_retry(url: str, rate_limiter: TokenBucket | None = None,
+                   session: requests.Session | None = None,
+                   headers: dict[str, str] | None = None) -> requests.Response:
+    '''GETs a url within the rate limit, retrying 429 and 5xx
+    responses with jittered exponential backoff'''
+    session = session or HTTP_SESSION
+    for attempt in range(MAX_RETRIES + 1):
+        if rate_limiter:
+            rate_limiter.acquire()
+        response = session.get(url, headers=headers)
+        if response.status_code != 429 and response.status_code < 500:
+            return response
+        if attempt == MAX_RETRIES:
+            break
+        retry_after = response.headers.get('Retry-After', '')
+        delay = float(retry_after) if retry_after.isdigit() \
+            else BACKOFF_SECONDS * 2 ** attempt
+        logging.warning("HTTP %s from %s, retrying in %.1fs",
+                        response.status_code, url, delay)
+        time.sleep(delay + random.uniform(0, BACKOFF_SECONDS))
+    return response
+
+
+def count_cache_result(result: str):
+    '''Adds one to a response cache counter'''
+    with CACHE_STATS_LOCK:
+        CACHE_STATS[result] += 1
+
+
+def log_cache_stats():
+    '''Logs the response cache's hits and misses
+    since it was last logged, then resets them'''
+    with CACHE_STATS_LOCK:
+        logging.info("HTTP cache: %s hits, %s revalidated, %s misses",
+                     CACHE_STATS['hits'], CACHE_STATS['revalidated'],
+                     CACHE_STATS['misses'])
+        for result in CACHE_STATS:
+            CACHE_STATS[result] = 0
+
+
+def prune_cache(max_age: float | None = None, max_bytes: int | None = None):
+    '''Evicts cached responses not refreshed within max_age seconds, then
+    the least recently refreshed until the cache fits in max_bytes'''
+    max_age = CACHE_MAX_AGE if max_age is None else max_age
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return
+    entries = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(CACHE_DIR, name.removesuffix('.json'))
+        try:
+            entries.append((os.path.getmtime(path + '.json'),
+                            os.path.getsize(path + '.json')
+                            + os.path.getsize(path + '.body'), path))
+        except OSError:
+            continue
+
+    now = time.time()
+    kept_bytes = 0
+    evicted = 0
+    for refreshed_at, size, path in sorted(entries, reverse=True):
+        if now - refreshed_at <= max_age and kept_bytes + size <= max_bytes:
+            kept_bytes += size
+            continue
+        for suffix in ('.json', '.body'):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+        evicted += 1
+    if evicted:
+        logging.info("HTTP cache: evicted %s entries, %s bytes kept",
+                     evicted, kept_bytes)
+
+
+def get_cache_path(url: str) -> str:
+    '''Gets the file a url's cached response is kept in'''
+    return os.path.join(CACHE_DIR, hashlib.sha256(url.encode()).hexdigest())
+
+
+def read_cache_entry(url: str) -> dict | None:
+    '''Reads a url's cached response, or None if it isn't cached'''
+    path = get_cache_path(url)
+    try:
+        with open(path + '.json', encoding='utf_8') as meta_file:
+            entry = json.load(meta_file)
+        with open(path + '.body', 'rb') as body_file:
+            entry['body'] = body_file.read()
+        return entry
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache_entry(url: str, body: bytes, headers, etag: str | None,
+                      last_modified: str | None):
+    '''Caches a response's body and validators, replacing any older copy'''
+    path = get_cache_path(url)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path + '.body.tmp', 'wb') as body_file:
+            body_file.write(body)
+        with open(path + '.json.tmp', 'w', encoding='utf_8') as meta_file:
+            json.dump({'fetched_at': time.time(), 'etag': etag,
+                       'last_modified': last_modified,
+                       'content_type': headers.get('Content-Type')}, meta_file)
+        os.replace(path + '.body.tmp', path + '.body')
+        os.replace(path + '.json.tmp', path + '.json')
+    except OSError as e:
+        logging.warning("Could not cache %s: %s", url, e)
+
+
+def make_cached_response(url: str, entry: dict) -> requests.Response:
+    '''Rebuilds a response from a cache entry'''
+    response = requests.Response()
+    response.url = url
+    response.status_code = 200
+    response._content = entry['body']  # pylint: disable=protected-access
+    if entry.get('content_type'):
+        response.headers['Content-Type'] = entry['content_type']
+    return response
+
+
+def get_cached(url: str, ttl: float, rate_limiter: TokenBucket | None = None,
+               session: requests.Session | None = None) -> requests.Response:
+    '''GETs a url through the on-disk response cache. Responses younger
+    than ttl seconds are reused as they are, and older ones are
+    revalidated with their ETag or Last-Modified date'''
+    entry = read_cache_entry(url)
+    if entry and time.time() - entry['fetched_at'] < ttl:
+        count_cache_result('hits')
+        return make_cached_response(url, entry)
+
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    response = get_with_retry(url, rate_limiter, session, headers or None)
+
+    if response.status_code == 304 and entry:
+        count_cache_result('revalidated')
+        write_cache_entry(url, entry['body'],
+                          {'Content-Type': entry.get('content_type')},
+                          response.headers.get('ETag', entry.get('etag')),
+                          response.headers.get('Last-Modified',
+                                               entry.get('last_modified')))
+        return make_cached_response(url, entry)
+
+    count_cache_result('misses')
+    if response.status_code == 200:
+        write_cache_entry(url, response.content, response.headers,
+                          response.headers.get('ETag'),
+                          response.headers.get('Last-Modified'))
+    return response
+
+
+def crawl_pages(get_page, known_ids: set[str],
+                max_pages: int, workers: int) -> list[dict[str]]:
+    '''Fetches pages 1 to max_pages of a newest-first listing, `workers`
+    pages at a time, stopping at the first page that is empty or
+    whose games' app_ids are all already known'''
+    games = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for first_page in range(1, max_pages + 1, workers):
+            pages = range(first_page, min(first_page + workers, max_pages + 1))
+            for page, page_games in zip(pages, executor.map(get_page, pages)):
+                if not page_games or all(str(game['app_id']) in known_ids
+                                         for game in page_games):
+                    logging.info("Reached known games on page %s", page)
+                    return games
+                games.extend(page_games)
+    return games
@@ -0,0 +1,135 @@
+'''Compacts each store's time-partitioned S3 dataset. Every EL run
+appends a few small parquet files to each partition it touches, so each
+partition's files are merged into one file, sorted by app_id and
+compressed with zstd, which readers list and fetch in one request.'''
+import logging
+import posixpath
+from uuid import uuid4
+import boto3
+import pandas as pd
+import awswrangler as wr
+from compaction_manifest import (  # pylint: disable=import-error
+    COMPACTED_PREFIX, get_ingest_date, get_live_objects, is_compacted_object,
+    read_compaction_manifest, write_compaction_manifest)
+
+S3_PATH = "s3://c18-game-tracker-s3/input/"
+STORES = ['steam', 'gog', 'epic']
+# Partitions with fewer files than this are left alone
+MIN_FILES = 2
+COMPRESSION = 'zstd'
+
+
+def get_session() -> boto3.Session:
+    '''Creates session with credentials in environment'''
+    session = boto3.Session()
+    creds = session.get_credentials()
+    if creds is None:
+        raise RuntimeError("Error: AWS credentials not found.")
+    return session
+
+
+def get_partitions(objects: list[str]) -> dict[str, list[str]]:
+    '''Groups files by the partition folder they are in'''
+    partitions = {}
+    for path in objects:
+        partitions.setdefault(posixpath.dirname(path), []).append(path)
+    return partitions
+
+
+def get_column_types(objects: list[str],
+                     session: boto3.Session) -> dict[str, str] | None:
+    '''Reads the column types declared when the files were uploaded, so
+    the compacted file keeps them, or None if the files disagree'''
+    try:
+        column_types, _ = wr.s3.read_parquet_metadata(objects,
+                                                      boto3_session=session)
+        return column_types
+    except wr.exceptions.InvalidSchemaConvergence as e:
+        logging.warning("Files have different schemas, inferring types: %s", e)
+        return None
+
+
+def compact_partition(partition: str, objects: list[str],
+                      session: boto3.Session) -> str:
+    '''Merges a partition's files into one new file sorted
+    by app_id and returns its path'''
+    df = pd.concat([wr.s3.read_parquet(path, boto3_session=session)
+                    for path in objects], ignore_index=True)
+    df = df.sort_values('app_id', key=lambda app_ids: app_ids.astype(str),
+                        kind='stable', ignore_index=True)
+    compacted_path = f"{partition}/{COMPACTED_PREFIX}{uuid4().hex}.parquet"
+    wr.s3.to_parquet(df, compacted_path, index=False,
+                     compression=COMPRESSION,
+                     dtype=get_column_types(objects, session),
+                     boto3_session=session)
+    logging.info("Compacted %s files with %s rows into %s",
+                 len(objects), len(df), compacted_path)
+    return compacted_path
+
+
+def compact_ingest_date(dataset_path: str, ingest_date: str | None,
+                        listed: list[str], session: boto3.Session) -> dict[str, list[str]]:
+    '''Compacts every partition of one ingest_date with at least MIN_FILES
+    files and returns the compactions made. Days whose partitions hold one
+    file each have nothing to replace or clean up, so their manifest shard
+    is not read. Recording compactions in the shard is the point where
+    readers switch to the new files, so replaced files are only deleted after that'''
+    if all(len(objects) == 1 for objects in get_partitions(listed).values()):
+        return {}
+    manifest = read_compaction_manifest(dataset_path, session, ingest_date)
+
+    # Left by a run that stopped before recording its compactions
+    orphans = [path for path in listed
+               if is_compacted_object(path) and path not in manifest]
+    if orphans:
+        logging.warning("Deleting %s unrecorded compacted files", len(orphans))
+        wr.s3.delete_objects(orphans, boto3_session=session)
+
+    compactions = {}
+    for partition, objects in get_partitions(
+            get_live_objects(listed, manifest)).items():
+        if len(objects) >= MIN_FILES:
+            compactions[compact_partition(partition, objects, session)] = objects
+    if not compactions:
+        return compactions
+
+    write_compaction_manifest(dataset_path, manifest | compactions,
+                              session, ingest_date)
+    replaced = [path for objects in compactions.values() for path in objects]
+    wr.s3.delete_objects(replaced, boto3_session=session)
+    return compactions
+
+
+def compact_store(store_name: str, session: boto3.Session) -> dict[str, list[str]]:
+    '''Compacts a store's dataset one ingest_date at a time
+    and returns the compactions made'''
+    dataset_path = S3_PATH + store_name + '/'
+    listed = wr.s3.list_objects(dataset_path, suffix='.parquet',
+                                boto3_session=session)
+    ingest_dates = {}
+    for path in listed:
+        ingest_dates.setdefault(get_ingest_date(path), []).append(path)
+
+    compactions = {}
+    for ingest_date, objects in ingest_dates.items():
+        compactions |= compact_ingest_date(dataset_path, ingest_date,
+                                           objects, session)
+    if not compactions:
+        logging.info("Nothing to compact for %s", store_name)
+        return compactions
+
+    logging.info("Compacted %s files into %s for %s",
+                 sum(map(len, compactions.values())), len(compactions), store_name)
+    return compactions
+
+
+def main(store_names: list[str] | None = None):
+    '''Compacts the datasets of the given stores, or of every store'''
+    session = get_session()
+    for store_name in store_names or STORES:
+        compact_store(store_name, session)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
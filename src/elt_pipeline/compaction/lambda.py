@@ -0,0 +1,18 @@
+# pylint: disable=import-error
+'''Module containing lambda handler for the S3 compaction job'''
+import logging
+from compact import main
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def handler(event, context):
+    '''Lambda handler that compacts the given stores' datasets, or all of them'''
+    try:
+        main(event.get('stores') if isinstance(event, dict) else None)
+        print(f'{event}: Lambda time remaining in MS:',
+              context.get_remaining_time_in_millis())
+        return {'statusCode': 200}
+    except (TypeError, ValueError, IndexError) as e:
+        return {'statusCode': 500, 'error': str(e)}
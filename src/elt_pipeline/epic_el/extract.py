@@ -1,16 +1,42 @@
 """Script to scrape today's releases from the epic games store"""
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
-import awswrangler as wr
 import boto3
+import cloudscraper
 from epicstore_api import EpicGamesStoreAPI, OfferData
+from app_id_index import get_indexed_app_ids  # pylint: disable=import-error
+from http_client import (  # pylint: disable=import-error
+    configure_session, get_cached)
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 S3_PATH = "s3://c18-game-tracker-s3/input/epic/"
-api = EpicGamesStoreAPI()
+# Keeps cloudscraper's own TLS adapter, which the store needs to get
+# past Cloudflare, but with the shared pool sizes and timeouts
+EPIC_SESSION = configure_session(cloudscraper.create_scraper())
+api = EpicGamesStoreAPI(session=EPIC_SESSION)
+
+PRODUCT_MAPPING_URL = "https://store-content.ak.epicgames.com/api/content/productmapping"
+# Seconds the product mapping is reused from the cache before being revalidated
+PRODUCT_MAPPING_TTL = 6 * 60 * 60
+
+EPIC_PRODUCT_URL = "https://store-content.ak.epicgames.com/api/en-US/content/products/"
+EPIC_STORE_URL = "https://store.epicgames.com/en-US/p/"
+SUMMARY_WORKERS = 16
+# Seconds product pages are reused from the cache before being revalidated
+PRODUCT_CACHE_TTL = 24 * 60 * 60
+# Offers per GraphQL request, and requests sent at a time
+OFFER_BATCH_SIZE = 20
+OFFER_BATCH_WORKERS = 4
+
+# Store search pages read for games released around the cutoff date
+CANDIDATE_PAGE_SIZE = 40
+MAX_CANDIDATE_PAGES = 10
+# Days either side of the cutoff searched, as the search and offer
+# details don't always agree on a game's release date
+RELEASE_WINDOW_DAYS = 1
 
 
 def get_session() -> boto3.Session:
@@ -22,80 +48,144 @@ def get_session() -> boto3.Session:
     return session
 
 
-def get_existing_games(path: str, session) -> list[str]:
-    '''Reads the entire dataset from S3 (partitioned by year/month/day).
-    Returns a DataFrame containing existing games' app IDs'''
+def get_existing_games(path: str, session) -> set[str]:
+    '''Returns a set of the app IDs of games already uploaded, read from
+    the store's app_id index, which is built from the dataset if missing.
+    Read errors are raised rather than treated as an empty store'''
+    return get_indexed_app_ids(path, session)
+
+
+def get_product_mapping() -> dict[str, str]:
+    '''Gets the {namespace: slug} product mapping through the response
+    cache, which revalidates it by ETag once it is stale'''
+    response = get_cached(PRODUCT_MAPPING_URL, PRODUCT_MAPPING_TTL,
+                          session=EPIC_SESSION)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_slug_namespaces(product_map: dict[str, str]) -> dict[str, str]:
+    '''Indexes the {namespace: slug} product mapping by slug'''
+    return {slug: namespace for namespace, slug in product_map.items()}
+
+
+def get_product_offers(slug: str) -> list[dict]:
+    '''Fetches a product page and returns a summary
+    of each offer on it, or nothing if it fails'''
     try:
-        df = wr.s3.read_parquet(path, dataset=True, columns=[
-            'app_id'], boto3_session=session)
-        return df['app_id'].astype(str).tolist()
+        response = get_cached(EPIC_PRODUCT_URL + slug, PRODUCT_CACHE_TTL,
+                              session=EPIC_SESSION)
+        if response.status_code == 404:
+            logging.warning("Skipping game %s because product is None.", slug)
+            return []
+        response.raise_for_status()
+        product = response.json()
     except Exception as e:  # pylint: disable=broad-exception-caught
-        logging.error("No existing data found in S3: %s", e)
+        logging.warning("Error getting data for %s: %s", slug, e)
         return []
 
-
-def get_epic_game_summaries() -> list:
-    '''Fetches newly listed Epic games '''
     summaries = []
-    product_map = api.get_product_mapping()
-
-    for i, (namespace, slug) in enumerate(product_map.items()):
-        try:
-            product = api.get_product(slug)
-            if not product:
-                logging.warning(
-                    "Skipping game %s because product is None.", slug)
-                continue
-
-            for page in product.get('pages', []):
-                if 'offer' in page and 'id' in page['offer']:
-                    offer = page.get('offer', {})
-                    offer_id = offer.get('id')
-                    if offer_id:
-                        summaries.append({
-                            'app_id': offer_id,
-                            'url': f"https://store.epicgames.com/en-US/p/{slug}",
-                            'title': slug
-                        })
-
-        except Exception as e:  # pylint: disable=broad-exception-caught
-            logging.warning("Error getting data for %s: %s", slug, e)
-            continue
-
+    for page in product.get('pages', []):
+        offer_id = (page.get('offer') or {}).get('id')
+        if offer_id:
+            summaries.append({
+                'app_id': offer_id,
+                'url': EPIC_STORE_URL + slug,
+                'title': slug
+            })
     return summaries
 
 
+def get_epic_game_summaries(product_map: dict[str, str] | None = None,
+                            known_ids: set[str] = frozenset()) -> list:
+    '''Fetches newly listed Epic games, SUMMARY_WORKERS products at a
+    time, skipping offers already uploaded. Every product is read, as new
+    editions and bundles are added as offers under existing products, but
+    product pages come from the response cache while they are fresh'''
+    if product_map is None:
+        product_map = get_product_mapping()
+    logging.info("Fetching %s Epic products", len(product_map))
+
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+        return [summary for offers in executor.map(get_product_offers,
+                                                   product_map.values())
+                for summary in offers
+                if str(summary['app_id']) not in known_ids]
+
+
+def get_release_candidates(release_cutoff: datetime.date) -> tuple[list[dict], dict[str, str]]:
+    '''Searches the store for offers released around the cutoff date,
+    returning their summaries and a {namespace: slug} mapping for them'''
+    window = timedelta(days=RELEASE_WINDOW_DAYS)
+    release_date = (f"[{release_cutoff - window}T00:00:00.000Z, "
+                    f"{release_cutoff + window + timedelta(days=1)}T00:00:00.000Z]")
+    summaries = []
+    product_map = {}
+    for page in range(MAX_CANDIDATE_PAGES):
+        search = api.fetch_store_games(
+            count=CANDIDATE_PAGE_SIZE, sort_by='releaseDate', sort_dir='DESC',
+            release_date=release_date, start=page * CANDIDATE_PAGE_SIZE,
+            with_price=False)['data']['Catalog']['searchStore']
+        for element in search['elements']:
+            slug = (element.get('productSlug') or element.get('urlSlug')
+                    or '').split('/')[0]
+            if element.get('id') and slug:
+                summaries.append({
+                    'app_id': element['id'],
+                    'url': EPIC_STORE_URL + slug,
+                    'title': slug
+                })
+                if element.get('namespace'):
+                    product_map[element['namespace']] = slug
+        if (page + 1) * CANDIDATE_PAGE_SIZE >= search['paging']['total']:
+            break
+    logging.info("Found %s Epic offers released around %s",
+                 len(summaries), release_cutoff)
+    return summaries, product_map
+
+
+def get_catalog_offer(offer_data: dict | None) -> dict | None:
+    '''Picks the catalogOffer out of one offer query's response'''
+    return (((offer_data or {}).get('data') or {})
+            .get('Catalog') or {}).get('catalogOffer')
+
+
+def parse_catalog_offer(catalog: dict, slug: str) -> dict:
+    '''Reads the game details from an offer's catalogOffer'''
+    dev_name = ''
+    for attr in catalog.get('customAttributes', []):
+        if attr['key'] == 'developerName':
+            dev_name = attr['value']
+
+    release_date = catalog.get(
+        'releaseDate') or catalog.get('effectiveDate') or ''
+
+    return {
+        'title': slug,
+        'app_id': catalog['id'],
+        'publishers': catalog.get('publisherName', []),
+        'developers': [dev_name] if dev_name else [],
+        'description': catalog.get('description', ''),
+        'requirements': {'minimum': None},
+        'is_free': catalog.get('price', {}).get('totalPrice', {}).get('discountPrice', 1) == 0,
+        'price': catalog.get('price', {}).get('totalPrice', {}).get('discountPrice', 0),
+        'currency': catalog.get('price', {}).get('totalPrice', {}).get('currencyCode', 'USD'),
+        'genres': [tag.get('name') for tag in catalog.get('tags') if tag.get('name')],
+        'image': catalog.get('keyImages', [{}])[0].get('url', ''),
+        'release': release_date or ''
+    }
+
+
 def get_epic_game_details(offer_id: str, slug: str, namespace: str = '') -> dict:
     '''Fetches detailed data for a store listing'''
     try:
         offer_data = api.get_offers_data(OfferData(namespace, offer_id))
 
-        catalog = offer_data[0]['data']['Catalog']['catalogOffer']
+        catalog = get_catalog_offer(offer_data[0])
         if not catalog:
             raise ValueError(f"No catalogOffer data for {offer_id}")
 
-        dev_name = ''
-        for attr in catalog.get('customAttributes', []):
-            if attr['key'] == 'developerName':
-                dev_name = attr['value']
-
-        release_date = catalog.get(
-            'releaseDate') or catalog.get('effectiveDate') or ''
-
-        return {
-            'title': slug,
-            'app_id': catalog['id'],
-            'publishers': catalog.get('publisherName', []),
-            'developers': [dev_name] if dev_name else [],
-            'description': catalog.get('description', ''),
-            'requirements': {'minimum': None},
-            'is_free': catalog.get('price', {}).get('totalPrice', {}).get('discountPrice', 1) == 0,
-            'price': catalog.get('price', {}).get('totalPrice', {}).get('discountPrice', 0),
-            'currency': catalog.get('price', {}).get('totalPrice', {}).get('currencyCode', 'USD'),
-            'genres': [tag.get('name') for tag in catalog.get('tags') if tag.get('name')],
-            'image': catalog.get('keyImages', [{}])[0].get('url', ''),
-            'release': release_date or ''
-        }
+        return parse_catalog_offer(catalog, slug)
     except Exception as e:  # pylint: disable=broad-exception-caught
         logging.warning(f"Error fetching details for {offer_id}: {e}")
         return {
@@ -113,34 +203,74 @@ def get_epic_game_details(offer_id: str, slug: str, namespace: str = '') -> dict
         }
 
 
-def iterate_through_scraped_games(json_data: list[dict], release_cutoff: datetime.date) -> list:
+def get_offer_batch(offers: list[OfferData]) -> list[dict | None]:
+    '''Fetches several offers in one request and returns their
+    catalogOffers in order, with None for any that failed'''
+    try:
+        responses = api.get_offers_data(*offers)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.warning("Error fetching batch of %s offers: %s", len(offers), e)
+        return [None] * len(offers)
+    if not isinstance(responses, list):
+        responses = [responses]
+    catalogs = [get_catalog_offer(response) for response in responses]
+    return (catalogs + [None] * len(offers))[:len(offers)]
+
+
+def get_offers_details(items: list[dict], slug_namespaces: dict[str, str],
+                       batch_size: int = OFFER_BATCH_SIZE) -> list[dict]:
+    '''Fetches the details of each game's offer, batch_size offers per
+    request and OFFER_BATCH_WORKERS requests at a time, looking up
+    separately any offer missing from its batch's response'''
+    slugs = [item['url'].split('/')[-1] for item in items]
+    offers = [OfferData(slug_namespaces.get(slug, ''), item['app_id'])
+              for item, slug in zip(items, slugs)]
+    batches = [offers[i:i + batch_size]
+               for i in range(0, len(offers), batch_size)]
+
+    with ThreadPoolExecutor(max_workers=OFFER_BATCH_WORKERS) as executor:
+        catalogs = [catalog for batch in executor.map(get_offer_batch, batches)
+                    for catalog in batch]
+
+        details = [None] * len(offers)
+        for i, (catalog, slug) in enumerate(zip(catalogs, slugs)):
+            if catalog and catalog.get('id') == offers[i].offer_id:
+                try:
+                    details[i] = parse_catalog_offer(catalog, slug)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    logging.warning("Error reading offer %s: %s",
+                                    offers[i].offer_id, e)
+
+        missing = [i for i, game_details in enumerate(details)
+                   if game_details is None]
+        if missing:
+            logging.info("Looking up %s offers one at a time", len(missing))
+        singles = executor.map(
+            lambda i: get_epic_game_details(
+                offers[i].offer_id, slugs[i], offers[i].namespace), missing)
+        for i, game_details in zip(missing, singles):
+            details[i] = game_details
+    return details
+
+
+def iterate_through_scraped_games(json_data: list[dict], release_cutoff: datetime.date,
+                                  product_map: dict[str, str] | None = None) -> list:
     '''Adds relevant data to existing data'''
-    games_full_data = []
-    product_map = api.get_product_mapping()
-
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        futures = [
-            executor.submit(fetch_game_with_release_check,
-                            item, product_map, release_cutoff)
-            for item in json_data
-        ]
-        for f in futures:
-            result = f.result()
-            if result:
-                games_full_data.append(result)
+    if product_map is None:
+        product_map = get_product_mapping()
+    items = [item for item in json_data if item['app_id']]
+    details = get_offers_details(items, get_slug_namespaces(product_map))
 
+    games_full_data = []
+    for item, game_details in zip(items, details):
+        result = merge_if_released(item, game_details, release_cutoff)
+        if result:
+            games_full_data.append(result)
     return games_full_data
 
 
-def fetch_game_with_release_check(item, product_map, release_cutoff) -> dict | None:
-    """Checks if game just came out"""
-    app_id = item['app_id']
-    slug = item['url'].split('/')[-1]
-    namespace = next((ns for ns, s in product_map.items() if s == slug), '')
-    if not app_id:
-        return None
-
-    details = get_epic_game_details(app_id, slug, namespace)
+def merge_if_released(item: dict, details: dict, release_cutoff) -> dict | None:
+    """Combines a game's summary and details if it came out on the cutoff date"""
     release_str = details.get('release')
 
     try:
@@ -150,26 +280,39 @@ def fetch_game_with_release_check(item, product_map, release_cutoff) -> dict | N
                 return {**item, **details}
     except Exception as e:  # pylint: disable=broad-exception-caught
         logging.warning(
-            f"Error parsing release date for {app_id}: {e}. Release string: {release_str}")
+            f"Error parsing release date for {item['app_id']}: {e}. Release string: {release_str}")
 
     return None
 
 
+def fetch_game_with_release_check(item, slug_namespaces, release_cutoff) -> dict | None:
+    """Checks if game just came out"""
+    app_id = item['app_id']
+    slug = item['url'].split('/')[-1]
+    namespace = slug_namespaces.get(slug, '')
+    if not app_id:
+        return None
+
+    details = get_epic_game_details(app_id, slug, namespace)
+    return merge_if_released(item, details, release_cutoff)
+
+
 def main() -> list[dict]:
     """Main to run other functions"""
     main_session = get_session()
     existing_games = get_existing_games(S3_PATH, main_session)
 
-    scraped_games = get_epic_game_summaries()
+    release_cutoff = datetime.today().date()
+
+    scraped_games, product_map = get_release_candidates(release_cutoff)
     new_games = [
         game for game in scraped_games if str(game.get("app_id")) not in existing_games
     ]
 
     logging.info(f"Scraped {len(new_games)} new game(s) not already in S3.")
 
-    release_cutoff = datetime.today().date()
-
-    full_game_data = iterate_through_scraped_games(new_games, release_cutoff)
+    full_game_data = iterate_through_scraped_games(
+        new_games, release_cutoff, product_map)
 
     return full_game_data
 
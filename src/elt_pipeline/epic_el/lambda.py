@@ -6,9 +6,13 @@ from extract import (
     S3_PATH,
     get_existing_games,
     get_session,
+    get_product_mapping,
+    get_release_candidates,
     get_epic_game_summaries,
     iterate_through_scraped_games
 )
+from http_client import log_cache_stats, prune_cache
+from app_id_index import add_to_app_id_index
 from load import add_time_partitioning, upload_to_s3
 
 logger = logging.getLogger()
@@ -22,10 +26,16 @@ def run_pipeline():
     existing_games = get_existing_games(S3_PATH, pipeline_session)
     logging.info(f'Found {len(existing_games)} games on S3 bucket')
 
-    # Scraping
-    scraped_games = get_epic_game_summaries()
+    # Scraping only offers released around today, falling back to
+    # reading every product in the store
+    release_cutoff = datetime.today().date()
+    try:
+        scraped_games, product_map = get_release_candidates(release_cutoff)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.error(f'Epic release search failed, reading every product instead: {e}')
+        product_map = get_product_mapping()
+        scraped_games = get_epic_game_summaries(product_map, existing_games)
     logging.info(f'Scraped {len(scraped_games)} games from Epic Games Store')
-    # can limit number that are used
     new_games = [
         new_game for new_game in scraped_games
         if str(new_game.get("app_id")) not in existing_games
@@ -35,9 +45,9 @@ def run_pipeline():
     if not new_games:
         return None
 
-    # Add data from API with release date
-    release_cutoff = datetime.today().date()
-    full_game_data = iterate_through_scraped_games(new_games, release_cutoff)
+    # Add data from API, keeping games released today
+    full_game_data = iterate_through_scraped_games(
+        new_games, release_cutoff, product_map)
 
     if not full_game_data:
         logging.info("No full game data to process, exiting.")
@@ -48,6 +58,7 @@ def run_pipeline():
     # Turn into dataframe and load into S3
     df = add_time_partitioning(full_game_data)
     upload_to_s3(df, pipeline_session)
+    add_to_app_id_index(S3_PATH, existing_games, df['app_id'], pipeline_session)
     logging.info(f"Uploaded {len(df)} games to {S3_PATH}")
 
 
@@ -55,6 +66,8 @@ def handler(event, context):
     '''Handler function for lambda function'''
     try:
         run_pipeline()
+        log_cache_stats()
+        prune_cache()
         print(f'{event}: Lambda time remaining in MS:',
               context.get_remaining_time_in_millis())
         return {'statusCode': 200}
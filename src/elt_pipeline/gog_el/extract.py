@@ -5,15 +5,42 @@ and adds supplementary data to the json list.'''
 import logging
 import re
 import json
+import time
 from datetime import datetime
-from urllib.request import urlopen
-from bs4 import BeautifulSoup
-import requests
-import awswrangler as wr
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bs4 import BeautifulSoup, SoupStrainer
 import boto3
+from app_id_index import get_indexed_app_ids  # pylint: disable=import-error
+from http_client import (  # pylint: disable=import-error
+    crawl_pages, get_cached, get_html)
+from html_parser import class_strainer, make_soup  # pylint: disable=import-error
 
 GOG_URL = "https://www.gog.com/en/games/new"
 S3_PATH = "s3://c18-game-tracker-s3/input/gog/"
+FETCH_WORKERS = 8
+
+GOG_CATALOG_URL = "https://catalog.gog.com/v1/catalog"
+GOG_CATALOG_PARAMS = {
+    'limit': 48,
+    'order': 'desc:releaseDate',
+    'productType': 'in:game,pack',
+    'countryCode': 'GB',
+    'locale': 'en-GB',
+    'currencyCode': 'GBP'
+}
+CATALOG_PAGE_WORKERS = 3
+MAX_CATALOG_PAGES = 5
+
+# Seconds responses are reused from the cache before being revalidated
+CATALOG_CACHE_TTL = 5 * 60
+GAME_PAGE_CACHE_TTL = 24 * 60 * 60
+
+# Only the parts of each page the scrapers read are parsed
+NEW_RELEASE_TAGS = SoupStrainer('product-tile')
+GAME_PAGE_TAGS = class_strainer('productcard-basics__title',
+                                'product-actions-price__final-amount',
+                                'description', 'details')
 
 
 def get_session() -> boto3.Session:
@@ -25,26 +52,11 @@ def get_session() -> boto3.Session:
     return session
 
 
-def get_existing_games(path: str, session) -> list[str]:
-    '''Reads the entire dataset from S3 (partitioned by year/month/day).
-    Returns a list containing existing games' app IDs'''
-    try:
-        df = wr.s3.read_parquet(path, dataset=True, columns=[
-            'app_id'], boto3_session=session)
-        return df['app_id'].astype(str).tolist()
-    except Exception as e:
-        logging.error(f"No existing data found in S3: {e}")
-        return []
-
-
-def get_html(url: str) -> str:
-    """
-    Gets the html content of the webpage at a given url
-    """
-    with urlopen(url) as page:
-        html_bytes = page.read()
-        html = html_bytes.decode("utf_8")
-    return html
+def get_existing_games(path: str, session) -> set[str]:
+    '''Returns a set of the app IDs of games already uploaded, read from
+    the store's app_id index, which is built from the dataset if missing.
+    Read errors are raised rather than treated as an empty store'''
+    return get_indexed_app_ids(path, session)
 
 
 def extract_game_details(game_page: BeautifulSoup) -> dict[str:str]:
@@ -71,7 +83,7 @@ def parse_games_bs(html: str) -> list[dict[str]]:
     """
     total = 0
     games = []
-    recent_releases_soup = BeautifulSoup(html, "html.parser")
+    recent_releases_soup = make_soup(html, NEW_RELEASE_TAGS)
     # only first 12 games have their images load correctly
     for game_tile in recent_releases_soup.find_all('product-tile')[:12]:
         total += 1
@@ -94,12 +106,56 @@ def parse_games_bs(html: str) -> list[dict[str]]:
     return games
 
 
+def get_tile_image_url(cover_url: str) -> str:
+    """
+    Converts a catalog cover image url into the
+    2x webp product tile url used on the new releases page
+    """
+    return re.sub(r'(_[^/]+)?\.(png|jpg|jpeg|webp)$',
+                  '_product_tile_extended_432x243_2x.webp', cover_url)
+
+
+def get_catalog_page(page: int) -> list[dict[str]]:
+    """
+    Gets one page of the GOG catalog, newest releases first,
+    in the same format as parse_games_bs
+    """
+    url = f"{GOG_CATALOG_URL}?{urlencode(GOG_CATALOG_PARAMS | {'page': page})}"
+    response = get_cached(url, CATALOG_CACHE_TTL)
+    response.raise_for_status()
+    games = []
+    for product in response.json().get('products', []):
+        link = product.get('storeLink')
+        app_id = product.get('id')
+        image = product.get('coverHorizontal')
+        if link and app_id and image:
+            games.append({
+                'url': link,
+                'app_id': str(app_id),
+                'image': get_tile_image_url(image)
+            })
+        else:
+            logging.warning("Game %s not stored", app_id)
+    return games
+
+
+def crawl_new_releases(existing_games: set[str],
+                       max_pages: int = MAX_CATALOG_PAGES) -> list[dict[str]]:
+    """
+    Walks the GOG catalog newest first, fetching CATALOG_PAGE_WORKERS pages
+    at a time, and stops at the first page whose games are all already
+    stored or after max_pages pages
+    """
+    return crawl_pages(get_catalog_page, existing_games,
+                       max_pages, CATALOG_PAGE_WORKERS)
+
+
 def get_gog_game_details(html: str) -> dict[str]:
     """
     Takes the gog store url for a game
     and scrapes that page for useful data
     """
-    this_game_soup = BeautifulSoup(html, "html.parser")
+    this_game_soup = make_soup(html, GAME_PAGE_TAGS)
 
     title = this_game_soup.find(
         'h1', class_='productcard-basics__title').get_text().strip()
@@ -148,17 +204,53 @@ def get_gog_game_details(html: str) -> dict[str]:
     }
 
 
+def run_timed(func, *args):
+    '''Returns the result of a function along with the seconds it took'''
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def fetch_and_parse(url: str) -> tuple[dict[str], dict[str:float]]:
+    '''Downloads and parses a game's page, returning its details
+    along with the seconds spent on each step'''
+    html, fetch_seconds = run_timed(get_html, url, GAME_PAGE_CACHE_TTL)
+    details, parse_seconds = run_timed(get_gog_game_details, html)
+    return details, {'fetch': fetch_seconds, 'parse': parse_seconds}
+
+
 def iterate_through_scraped_games(json_data: list[dict[str]]):
     '''
-    Iterates through list of games and adds on supplementary data into each dict
+    Downloads and parses product pages FETCH_WORKERS at a time and merges
+    each game's details into its dict. Pages are parsed in the same threads
+    that download them, as lambda has no /dev/shm for a process pool, and
+    parsing with lxml overlaps with the other threads' downloads.
+    Pages that fail to download or parse are logged and skipped
     '''
-    games_full_data = []
-    for item in json_data:
-        link = item['url']
-        if link:
-            details = get_gog_game_details(get_html(link))
-            full_data = item | details
-            games_full_data.append(full_data)
+    items = [item for item in json_data if item['url']]
+    all_details = [None] * len(items)
+    busy_seconds = {'fetch': 0.0, 'parse': 0.0}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        futures = {executor.submit(fetch_and_parse, item['url']): i
+                   for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                all_details[i], seconds = future.result()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.warning("Failed to scrape %s: %s", items[i]['url'], e)
+                continue
+            for step, step_seconds in seconds.items():
+                busy_seconds[step] += step_seconds
+
+    games_full_data = [item | details for item, details in zip(items, all_details)
+                       if details is not None]
+    logging.info("Scraped %s/%s GOG pages in %.2fs "
+                 "(%.2fs downloading, %.2fs parsing, summed over workers)",
+                 len(games_full_data), len(items), time.perf_counter() - start,
+                 busy_seconds['fetch'], busy_seconds['parse'])
     return games_full_data
 
 
@@ -1,8 +1,10 @@
 # pylint: disable=logging-fstring-interpolation, import-error
 '''Runs EL pipeline from gog to S3 bucket'''
 import logging
-from extract import (GOG_URL, get_existing_games, get_html,
+from extract import (GOG_URL, get_existing_games, get_html, crawl_new_releases,
                      parse_games_bs, iterate_through_scraped_games)
+from http_client import log_cache_stats, prune_cache
+from app_id_index import add_to_app_id_index
 from load import S3_PATH, get_session, add_time_partitioning, upload_to_s3
 
 logger = logging.getLogger()
@@ -16,10 +18,12 @@ def run_pipeline():
     existing_games = get_existing_games(S3_PATH, pipeline_session)
     logging.info(f'Found {len(existing_games)} games on S3 bucket')
 
-    # Scraping
-    gog_html = get_html(GOG_URL)
-    # can limit number that are used
-    scraped_games = parse_games_bs(gog_html)
+    # Scraping, falling back to the first tiles of the new releases page
+    try:
+        scraped_games = crawl_new_releases(existing_games)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.error(f'GOG catalog crawl failed, scraping page instead: {e}')
+        scraped_games = parse_games_bs(get_html(GOG_URL))
     logging.info(f'Scraped {len(scraped_games)} games from gog')
     new_games = [
         new_game for new_game in scraped_games if str(new_game.get("app_id")) not in existing_games]
@@ -34,6 +38,7 @@ def run_pipeline():
     # Turn into dataframe and load into S3
     df = add_time_partitioning(full_game_data)
     upload_to_s3(df, pipeline_session)
+    add_to_app_id_index(S3_PATH, existing_games, df['app_id'], pipeline_session)
     logging.info(f"Uploaded to {S3_PATH}")
 
 
@@ -41,6 +46,8 @@ def handler(event, context):
     '''Handler function for lambda function'''
     try:
         run_pipeline()
+        log_cache_stats()
+        prune_cache()
         print(f'{event}: Lambda time remaining in MS:',
               context.get_remaining_time_in_millis())
         return {'statusCode': 200}
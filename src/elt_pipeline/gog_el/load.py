@@ -1,11 +1,29 @@
 '''Receiving json and upload to S3, time-partitioning by day'''
-from datetime import datetime
+from datetime import datetime, timezone
 import boto3
 import pandas as pd
 import awswrangler as wr
 
 S3_PATH = "s3://c18-game-tracker-s3/input/gog/"
 
+# Column types declared rather than inferred from the scraped dicts,
+# as the Athena types awswrangler maps to pyarrow types
+COLUMN_TYPES = {
+    'url': 'string',
+    'app_id': 'string',
+    'image': 'string',
+    'publishers': 'array<string>',
+    'developers': 'array<string>',
+    'description': 'string',
+    'requirements': 'string',
+    'is_free': 'boolean',
+    'price': 'bigint',
+    'currency': 'string',
+    'genres': 'array<string>',
+    'title': 'string',
+    'release': 'timestamp'
+}
+
 
 def get_session() -> boto3.Session:
     '''Creates session with credentials in environment'''
@@ -16,9 +34,16 @@ def get_session() -> boto3.Session:
     return session
 
 
+def get_ingest_date() -> str:
+    '''Gets today's UTC date, which partitions each run's files'''
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
 def add_time_partitioning(data: list[dict[str]]) -> pd.DataFrame:
-    '''Converts json to dataframe and adds Y/M/D columns'''
+    '''Converts json to dataframe and adds ingest date and
+    release Y/M/D columns'''
     df = pd.DataFrame(data)
+    df['ingest_date'] = get_ingest_date()
     df['release'] = pd.to_datetime(df['release'], errors='coerce')
 
     # Fill invalid or missing dates with a placeholder
@@ -31,14 +56,24 @@ def add_time_partitioning(data: list[dict[str]]) -> pd.DataFrame:
     return df
 
 
+def conform_to_schema(df: pd.DataFrame) -> pd.DataFrame:
+    '''Adds any declared columns the scraped games lack as nulls'''
+    for column in COLUMN_TYPES:
+        if column not in df.columns:
+            df[column] = None
+    return df
+
+
 def upload_to_s3(df: pd.DataFrame, session: boto3.Session):
-    '''Uses awswrangler to upload dataframe as a parquet file to S3 bucket'''
+    '''Uses awswrangler to upload dataframe as a parquet file to S3 bucket,
+    under the day it was ingested then the day the games were released'''
     wr.s3.to_parquet(
-        df=df,
+        df=conform_to_schema(df),
         path=S3_PATH,
         dataset=True,
         mode="append",
-        partition_cols=["year", "month", "day"],
+        partition_cols=["ingest_date", "year", "month", "day"],
+        dtype=COLUMN_TYPES,
         boto3_session=session
     )
     print(f"Uploaded to {S3_PATH}")
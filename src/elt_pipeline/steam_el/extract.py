@@ -2,15 +2,39 @@
 PC games and stores all scraped games in a json list.
 Takes json list of newly scraped games, requests data from API
 and adds supplementary data to the json list.'''
-import logging
-from urllib.request import urlopen
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from bs4 import SoupStrainer
 import requests
-import awswrangler as wr
 import boto3
+from app_id_index import get_indexed_app_ids  # pylint: disable=import-error
+from http_client import (  # pylint: disable=import-error
+    TokenBucket, crawl_pages, get_cached, get_html)
+from html_parser import make_soup  # pylint: disable=import-error
 
 STEAM_URL = "https://store.steampowered.com/search/?sort_by=Released_DESC&supportedlang=english"
 S3_PATH = "s3://c18-game-tracker-s3/input/steam"
+STEAM_APPDETAILS_URL = "https://store.steampowered.com/api/appdetails"
+STEAM_SEARCH_URL = "https://store.steampowered.com/search/results/"
+STEAM_SEARCH_PARAMS = {
+    'sort_by': 'Released_DESC',
+    'supportedlang': 'english',
+    'infinite': 1
+}
+SEARCH_PAGE_SIZE = 50
+SEARCH_PAGE_WORKERS = 3
+MAX_SEARCH_PAGES = 4
+# Only the links, where each search result lives, are parsed
+GAME_LINK_TAGS = SoupStrainer('a')
+
+# Seconds responses are reused from the cache before being revalidated
+SEARCH_CACHE_TTL = 5 * 60
+APPDETAILS_CACHE_TTL = 24 * 60 * 60
+
+MAX_WORKERS = 8
+# Steam allows roughly 200 appdetails requests per IP every 5 minutes
+RATE_LIMIT_REQUESTS = 200
+RATE_LIMIT_PERIOD = 300
 
 
 def get_session() -> boto3.Session:
@@ -22,26 +46,11 @@ def get_session() -> boto3.Session:
     return session
 
 
-def get_existing_games(path: str, session) -> list[str]:
-    '''Reads the entire dataset from S3 (partitioned by year/month/day).
-    Returns a DataFrame containing existing games' app IDs'''
-    try:
-        df = wr.s3.read_parquet(path, dataset=True, columns=[
-            'app_id'], boto3_session=session)
-        return df['app_id'].astype(str).tolist()
-    except Exception as e:
-        logging.error(f"No existing data found in S3: {e}")
-        return []
-
-
-def get_html(url):
-    """
-    Gets the html content of the webpage at a given url
-    """
-    with urlopen(url) as page:
-        html_bytes = page.read()
-        html = html_bytes.decode("utf_8")
-    return html
+def get_existing_games(path: str, session) -> set[str]:
+    '''Returns a set of the app IDs of games already uploaded, read from
+    the store's app_id index, which is built from the dataset if missing.
+    Read errors are raised rather than treated as an empty store'''
+    return get_indexed_app_ids(path, session)
 
 
 def parse_games_bs(html):
@@ -49,7 +58,7 @@ def parse_games_bs(html):
     Extracts the games from the steam website
     """
     games = []
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html, GAME_LINK_TAGS)
     a_tags = soup.find_all('a')
     for a_tag in a_tags:
         link = a_tag.get('href')
@@ -68,12 +77,41 @@ def parse_games_bs(html):
     return games
 
 
+STEAM_RATE_LIMITER = TokenBucket(RATE_LIMIT_REQUESTS, RATE_LIMIT_PERIOD)
+
+
+def get_search_page(page: int) -> list[dict[str]]:
+    """
+    Gets one page of Steam's search results, newest releases
+    first, from the JSON endpoint behind its infinite scroll
+    """
+    params = STEAM_SEARCH_PARAMS | {
+        'start': (page - 1) * SEARCH_PAGE_SIZE,
+        'count': SEARCH_PAGE_SIZE
+    }
+    response = get_cached(f"{STEAM_SEARCH_URL}?{urlencode(params)}",
+                          SEARCH_CACHE_TTL)
+    response.raise_for_status()
+    return parse_games_bs(response.json().get('results_html', ''))
+
+
+def crawl_search_results(existing_games: set[str],
+                         max_pages: int = MAX_SEARCH_PAGES) -> list[dict[str]]:
+    """
+    Walks Steam's search results newest first, fetching SEARCH_PAGE_WORKERS
+    pages at a time, and stops at the first page whose games are all
+    already stored or after max_pages pages
+    """
+    return crawl_pages(get_search_page, existing_games,
+                       max_pages, SEARCH_PAGE_WORKERS)
+
+
 def get_steam_game_details(app_id: int) -> dict[str]:
     '''Takes Steam store app ID and requests data through the API
     Returns dict of useful data'''
-    url = f"https://store.steampowered.com/api/appdetails?appids={app_id}"
+    url = f"{STEAM_APPDETAILS_URL}?appids={app_id}"
     try:
-        response = requests.get(url, timeout=10)
+        response = get_cached(url, APPDETAILS_CACHE_TTL, STEAM_RATE_LIMITER)
         if response.status_code == 200:
             data = response.json()
 
@@ -98,21 +136,25 @@ def get_steam_game_details(app_id: int) -> dict[str]:
         return {'app_id': app_id, 'error': f'Request failed: {str(e)}'}
 
 
-def iterate_through_scraped_games(json_data: list[dict[str]]):
+def iterate_through_scraped_games(json_data: list[dict[str]],
+                                  max_workers: int = MAX_WORKERS):
     '''
-    Iterates through list of games and adds on supplementary data into each dict
+    Fetches supplementary data for up to max_workers games at a time
+    and merges it into each dict, keeping the scraped order
     '''
+    items = [item for item in json_data if item['app_id']]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        all_details = list(executor.map(
+            get_steam_game_details, [item['app_id'] for item in items]))
+
     games_full_data = []
-    for item in json_data:
-        app_id = item['app_id']
-        if app_id:
-            details = get_steam_game_details(app_id)
-            if 'requirements' not in details or not isinstance(details['requirements'], dict) or 'minimum' not in details['requirements']:
-                details['requirements'] = {'minimum': None}
-            details['price'] = int(details['price']) if details['price'] else 0
-            # Merge original data with extra info
-            full_data = item | details
-            games_full_data.append(full_data)
+    for item, details in zip(items, all_details):
+        if 'requirements' not in details or not isinstance(details['requirements'], dict) or 'minimum' not in details['requirements']:
+            details['requirements'] = {'minimum': None}
+        details['price'] = int(details['price']) if details.get('price') else 0
+        # Merge original data with extra info
+        full_data = item | details
+        games_full_data.append(full_data)
     return games_full_data
 
 
@@ -1,24 +1,30 @@
 '''Runs EL pipeline from Steam to S3 bucket'''
 import logging
-from extract import (STEAM_URL, get_existing_games, get_html,
-                     parse_games_bs, iterate_through_scraped_games)
+from extract import (STEAM_URL, MAX_SEARCH_PAGES, get_existing_games, get_html,
+                     crawl_search_results, parse_games_bs,
+                     iterate_through_scraped_games)
+from http_client import log_cache_stats, prune_cache  # pylint: disable=import-error
+from app_id_index import add_to_app_id_index  # pylint: disable=import-error
 from load import S3_PATH, get_session, add_time_partitioning, upload_to_s3
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-def run_pipeline():
-    '''Runs pipeline that extracts steam data and loads data into S3'''
+def run_pipeline(max_pages: int = MAX_SEARCH_PAGES):
+    '''Runs pipeline that extracts steam data and loads data into S3.
+    max_pages caps how many pages of search results are crawled'''
     # Connect to S3 and get existing 'app_id's
     pipeline_session = get_session()
     existing_games = get_existing_games(S3_PATH, pipeline_session)
     logging.info(f'Found {len(existing_games)} games on S3 bucket')
 
-    # Scraping
-    steam_html = get_html(STEAM_URL)
-    # can limit number that are used
-    scraped_games = parse_games_bs(steam_html)
+    # Scraping, falling back to the first page of the search
+    try:
+        scraped_games = crawl_search_results(existing_games, max_pages)
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.error(f'Steam search crawl failed, scraping page instead: {e}')
+        scraped_games = parse_games_bs(get_html(STEAM_URL))
     logging.info(f'Scraped {len(scraped_games)} games from steam')
     new_games = [
         new_game for new_game in scraped_games if str(new_game.get("app_id")) not in existing_games]
@@ -33,13 +39,17 @@ def run_pipeline():
     # Turn into dataframe and load into S3
     df = add_time_partitioning(full_game_data)
     upload_to_s3(df, pipeline_session)
+    add_to_app_id_index(S3_PATH, existing_games, df['app_id'], pipeline_session)
     logging.info(f"Uploaded to {S3_PATH}")
 
 
 def handler(event, context):
     '''Handler function for lambda function'''
     try:
-        run_pipeline()
+        run_pipeline(event.get('max_pages', MAX_SEARCH_PAGES)
+                     if isinstance(event, dict) else MAX_SEARCH_PAGES)
+        log_cache_stats()
+        prune_cache()
         print(f'{event}: Lambda time remaining in MS:',
               context.get_remaining_time_in_millis())
         return {'statusCode': 200}
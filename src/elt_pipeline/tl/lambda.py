@@ -1,12 +1,12 @@
 # pylint: disable=import-error
 '''Module importing big function and containing lambda handler'''
-from transform_and_load_to_rds import main
+from transform_and_load_to_rds import main, get_run_options
 
 
 def handler(event, context):
     '''Lambda handler that runs the transform and load'''
     try:
-        main()
+        main(get_run_options(event))
         print(f'{event}: Lambda time remaining in MS:',
               context.get_remaining_time_in_millis())
         return {'statusCode': 200}
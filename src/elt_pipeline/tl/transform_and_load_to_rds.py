@@ -1,17 +1,18 @@
 # pylint: disable=line-too-long
 """Script to take transformed data and stores into our RDS Postgres Database"""
 import os
+import io
 import logging
-from datetime import datetime, date
+from datetime import datetime, date, timedelta, timezone
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
 from dotenv import load_dotenv
 import pandas as pd
 from sqlalchemy import create_engine, text, Engine
 import awswrangler as wr
-from psycopg2 import connect
-from psycopg2.extensions import connection
-from psycopg2.extras import RealDictCursor
-import numpy as np
+from compaction_manifest import (  # pylint: disable=import-error
+    get_live_objects, read_compaction_manifests)
 
 BUCKET = 'c18-game-tracker-s3'
 S3_PATH = f"s3://{BUCKET}/input/"
@@ -20,108 +21,84 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-def get_db_connection() -> connection:
-    """Returns a live connection from the database"""
-    load_dotenv()
-    conn = connect(
-        user=os.environ["DATABASE_USERNAME"],
-        password=os.environ["DATABASE_PASSWORD"],
-        host=os.environ["DATABASE_IP"],
-        port=os.environ["DATABASE_PORT"],
-        database=os.environ["DATABASE_NAME"],
-        cursor_factory=RealDictCursor
-    )
-    return conn
-
-
-def read_db_table_into_df(table_name: str, conn) -> pd.DataFrame:
-    """Returns the data in an RDS table as a dataframe"""
-    return pd.read_sql(f"SELECT * FROM {table_name}", conn)
+# Days before today whose ingest_date partitions are listed by default
+DEFAULT_WINDOW_DAYS = 2
+LIST_WORKERS = 8
 
 
-def get_reference_data(raw_data: pd.DataFrame,
-                       existing_data: pd.DataFrame,
-                       table_name: str) -> pd.DataFrame:
+def read_db_table_into_df(table_name: str, conn,
+                          columns: list[str] | None = None,
+                          where: str | None = None,
+                          params: dict | None = None) -> pd.DataFrame:
     """
-    Combines incoming data with old data to create up to date
-    dataframe representing secondary tables like genre or developer
+    Returns the requested columns of the rows in an RDS table
+    matching an optional WHERE predicate as a dataframe
     """
-    id_col = f"{table_name}_id"
+    sql = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+    if where:
+        sql += f" WHERE {where}"
 
-    if id_col in existing_data.columns:
-        existing_data[id_col] = (
-            pd.to_numeric(existing_data[id_col], errors='coerce')
-              .fillna(0)
-              .astype(int)
-        )
-    else:
-        existing_data[id_col] = pd.Series(dtype=int)
-
-    valid_lists = raw_data[table_name +
-                           's'].apply(lambda x: isinstance(x, (list, np.ndarray)))
-    cleaned_column = raw_data.loc[valid_lists, table_name + 's']
-    cleaned_column = [
-        item for sublist in cleaned_column for item in sublist]
-
-    new_data = list(set(cleaned_column))
-
-    added_data = list(
-        filter(lambda x: not x in existing_data[table_name + '_name'].unique(), new_data))
-    highest_existing_id = max(existing_data[table_name + '_id'], default=0)
-    data_to_add_to_rds = pd.DataFrame({
-        table_name + '_name': added_data,
-        table_name + '_id': list(range(
-            highest_existing_id + 1,
-            highest_existing_id + len(added_data) + 1
-        ))
-    })
-
-    return {
-        'new': data_to_add_to_rds,
-        'all': pd.concat([existing_data, data_to_add_to_rds])
-    }
+    result = conn.execute(text(sql), params or {})
+    return pd.DataFrame(result.fetchall(), columns=columns or list(result.keys()))
 
 
-def iterrows_dict(df: pd.DataFrame) -> dict:
+def get_assignment_dfs(main_table: pd.DataFrame,
+                       main_table_name: str,
+                       reference_table_names: list[str],
+                       conn,
+                       known_ids: dict[str:dict] | None = None) -> dict[str:pd.DataFrame]:
     """
-    Allows you to iterate through the rows of a
-    pandas dataframe and get each row as a dictionary
+    Returns a dataframe for each assigment table mediating a many to many
+    relationship, built in one pass by exploding every reference list
+    column and joining it against the resolved reference IDs
     """
-    columns = list(df.columns)
-    for row in df.itertuples(index=False):
-        yield {columns[i]: row[i] for i in range(len(columns))}
+    main_id_col = main_table_name + '_id'
+    list_cols = [name + 's' for name in reference_table_names]
+
+    long_df = main_table[[main_id_col] + list_cols].melt(
+        id_vars=main_id_col, value_vars=list_cols,
+        var_name='list_col', value_name='reference_name')
+    long_df = long_df.explode('reference_name').dropna(
+        subset=['reference_name'])
+    long_df['list_col'] = pd.Categorical(long_df['list_col'], list_cols)
+
+    reference_frames = []
+    for name, list_col in zip(reference_table_names, list_cols):
+        id_map = resolve_reference_ids(
+            conn, name,
+            long_df.loc[long_df['list_col'] == list_col, 'reference_name'].unique(),
+            known_ids)
+        reference_frames.append(pd.DataFrame({
+            'list_col': list_col,
+            'reference_name': list(id_map.keys()),
+            'reference_id': list(id_map.values())
+        }))
+    reference_df = pd.concat(reference_frames, ignore_index=True)
+    reference_df['list_col'] = pd.Categorical(
+        reference_df['list_col'], list_cols)
+
+    merged = long_df.merge(reference_df, on=['list_col', 'reference_name'])
+
+    return {
+        name + '_assignment': merged.loc[
+            merged['list_col'] == list_col, [main_id_col, 'reference_id']
+        ].rename(columns={'reference_id': name + '_id'}).reset_index(drop=True)
+        for name, list_col in zip(reference_table_names, list_cols)
+    }
 
 
 def get_assignment_df(main_table: pd.DataFrame,
                       main_table_name: str,
                       reference_table_name: str,
-                      conn):
+                      conn,
+                      known_ids: dict[str:dict] | None = None):
     """
     Returns a pandas dataframe representing the
     assigment table mediating a many to many relationship
     """
-    assignment_table_rows = []
-    for row in iterrows_dict(main_table):
-        for item in row[reference_table_name + 's']:
-            reference_id = get_or_create_id(
-                conn,
-                table=reference_table_name,
-                name_col=f"{reference_table_name}_name",
-                name_val=item,
-                id_col=f"{reference_table_name}_id"
-            )
-            assignment_table_rows.append(
-                {
-                    main_table_name + '_id': row[main_table_name + '_id'],
-                    reference_table_name + '_id': reference_id
-                }
-            )
-    if not assignment_table_rows:
-        return pd.DataFrame({
-            main_table_name + '_id': [],
-            reference_table_name + '_id': []
-        })
-    return pd.DataFrame(assignment_table_rows)
+    return get_assignment_dfs(main_table, main_table_name,
+                              [reference_table_name], conn,
+                              known_ids)[reference_table_name + '_assignment']
 
 
 def process_data(old_dataframe: pd.DataFrame,
@@ -192,55 +169,191 @@ GAME_DATA_TRANSLATION_BASE = [
 ]
 
 
-def get_game_id(count: int) -> list[int]:
+def get_game_id(conn, count: int) -> list[int]:
     """Gets current game ids from database to help merge assignment tables"""
-    conn = get_db_connection()
+    result = conn.execute(text("""
+        SELECT nextval(pg_get_serial_sequence('game','game_id'))
+        FROM generate_series(1, :count)
+    """), {"count": count})
+    return [row[0] for row in result]
 
-    try:
-        cur = conn.cursor(cursor_factory=None)
-        cur.execute(f"""
-            SELECT nextval(pg_get_serial_sequence('game','game_id'))
-            FROM generate_series(1, %s)
-        """, (count,))
 
-        rows = cur.fetchall(
-        )
+def get_new_app_ids(conn, app_ids: list[str]) -> set[str]:
+    """
+    Sends candidate app ids to the RDS and returns
+    only those not already in the game table
+    """
+    if not app_ids:
+        return set()
+    result = conn.execute(text("""
+        SELECT candidate.app_id
+        FROM unnest(CAST(:app_ids AS TEXT[])) AS candidate(app_id)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM game WHERE game.app_id = candidate.app_id
+        );
+    """), {"app_ids": app_ids})
+    return {row[0] for row in result}
+
+
+def get_window_partitions(dataset_path: str, window_days: int,
+                          today: date | None = None) -> list[str]:
+    """
+    Gets the prefixes of the ingest_date partitions
+    from window_days before today up to today
+    """
+    today = today or datetime.now(timezone.utc).date()
+    return [f"{dataset_path}ingest_date={today - timedelta(days=offset)}/"
+            for offset in range(window_days, -1, -1)]
 
-        new_ids = [row["nextval"] for row in rows]
-    finally:
-        conn.close()
 
-    return new_ids
+def list_store_objects(dataset_path: str, window_days: int | None = None,
+                       ingest_date: str | None = None) -> list[str]:
+    """
+    Lists the parquet objects in a store's dataset, only looking in one
+    day's ingest_date partition or those inside the window if given either
+    """
+    if ingest_date is not None:
+        prefixes = [f"{dataset_path}ingest_date={ingest_date}/"]
+    elif window_days is not None:
+        prefixes = get_window_partitions(dataset_path, window_days)
+    else:
+        return wr.s3.list_objects(dataset_path, suffix='.parquet')
+    with ThreadPoolExecutor(max_workers=LIST_WORKERS) as executor:
+        listings = executor.map(
+            lambda prefix: wr.s3.list_objects(prefix, suffix='.parquet'),
+            prefixes)
+    return [key for listing in listings for key in listing]
+
+
+def get_unprocessed_objects(conn, store: dict[str],
+                            full_rescan: bool = False,
+                            window_days: int | None = None,
+                            ingest_date: str | None = None) -> list[str]:
+    """
+    Lists the parquet objects under a store's S3 prefix that are
+    not yet recorded as processed, or every object on a full rescan,
+    optionally only those ingested on one day or inside a window of days.
+    Objects the compaction job has replaced are left out, and compacted
+    objects made only of processed objects are marked processed too
+    """
+    dataset_path = S3_PATH + store['store_name'] + '/'
+    listed = list_store_objects(dataset_path, window_days, ingest_date)
+    manifest = read_compaction_manifests(dataset_path, listed)
+    objects = get_live_objects(listed, manifest)
+    if full_rescan or not objects:
+        return objects
+
+    result = conn.execute(text("""
+        SELECT listed.object_key
+        FROM unnest(CAST(:object_keys AS TEXT[])) AS listed(object_key)
+        WHERE NOT EXISTS (
+            SELECT 1 FROM processed_s3_object
+            WHERE processed_s3_object.object_key = listed.object_key
+        );
+    """), {"object_keys": objects})
+    unprocessed = {row[0] for row in result}
+
+    compacted = [key for key in objects if key in unprocessed and key in manifest]
+    if compacted:
+        already_processed = get_processed_compactions(conn, compacted, manifest)
+        mark_objects_processed(conn, store['store_id'], already_processed)
+        unprocessed -= set(already_processed)
+    return [key for key in objects if key in unprocessed]
+
+
+def get_processed_compactions(conn, compacted: list[str],
+                              manifest: dict[str:list[str]]) -> list[str]:
+    """
+    Finds the compacted objects whose source objects were all processed,
+    either directly or by being compacted from processed objects in turn
+    """
+    sources = set()
+    to_visit = list(compacted)
+    while to_visit:
+        for source in manifest.get(to_visit.pop(), []):
+            if source not in sources:
+                sources.add(source)
+                to_visit.append(source)
+
+    result = conn.execute(text("""
+        SELECT object_key FROM processed_s3_object
+        WHERE object_key = ANY(:object_keys);
+    """), {"object_keys": sorted(sources)})
+    processed = {row[0] for row in result}
+
+    def is_processed(key: str) -> bool:
+        return key in processed or (
+            key in manifest and all(map(is_processed, manifest[key])))
+
+    return [key for key in compacted
+            if all(map(is_processed, manifest[key]))]
+
+
+def mark_objects_processed(conn, store_id: int, object_keys: list[str]) -> None:
+    """Records S3 objects as processed so later runs skip them"""
+    if not object_keys:
+        return
+    conn.execute(text("""
+        INSERT INTO processed_s3_object (store_id, object_key)
+        SELECT :store_id, unnest(CAST(:object_keys AS TEXT[]))
+        ON CONFLICT (object_key) DO NOTHING;
+    """), {"store_id": store_id, "object_keys": object_keys})
+    logging.info("%s S3 objects marked as processed", len(object_keys))
+
+
+def get_empty_tables() -> dict[str:pd.DataFrame]:
+    """Returns the transform output for a run with no new data"""
+    return {
+        'genre_assignment': pd.DataFrame(),
+        'publisher_assignment': pd.DataFrame(),
+        'developer_assignment': pd.DataFrame(),
+        'game': pd.DataFrame(),
+        's3_objects': []
+    }
 
 
-def transform_s3_steam_data(conn, store: dict[str]) -> dict[str:pd.DataFrame]:
+def transform_s3_steam_data(conn, store: dict[str],
+                            known_ids: dict[str:dict] | None = None,
+                            full_rescan: bool = False,
+                            window_days: int | None = None,
+                            ingest_date: str | None = None) -> dict[str:pd.DataFrame]:
     """
-    Reads data in the S3, discards any data already in the RDS and
-    transforms it into the correct format to be uploaded to the RDS
+    Reads data in the S3 not yet processed, from every partition or only
+    those ingested on one day or inside a window of days, discards any data
+    already in the RDS and transforms it into the correct format to be
+    uploaded to the RDS
     """
     try:
-        raw_df = wr.s3.read_parquet(S3_PATH + store['store_name'])
+        new_objects = get_unprocessed_objects(
+            conn, store, full_rescan, window_days, ingest_date)
+        if not new_objects:
+            logging.info("No unprocessed S3 objects for %s",
+                         store['store_name'])
+            return get_empty_tables()
+        raw_df = wr.s3.read_parquet(new_objects)
     except Exception as e:
         logging.error('Error reading S3 path %s: %s',
                       S3_PATH + store['store_name'], e)
-        return {
-            'genre': pd.DataFrame(),
-            'publisher': pd.DataFrame(),
-            'developer': pd.DataFrame(),
-            'genre_assignment': pd.DataFrame(),
-            'publisher_assignment': pd.DataFrame(),
-            'developer_assignment': pd.DataFrame(),
-            'game': pd.DataFrame(),
-        }
+        return get_empty_tables()
+    logging.info("%s unprocessed S3 objects read for %s",
+                 len(new_objects), store['store_name'])
+    return transform_raw_data(conn, store, raw_df, known_ids) | {
+        's3_objects': new_objects}
+
+
+def transform_raw_data(conn, store: dict[str], raw_df: pd.DataFrame,
+                       known_ids: dict[str:dict] | None = None) -> dict[str:pd.DataFrame]:
+    """
+    Discards the games in raw S3 data already in the RDS and transforms
+    the rest into the correct format to be uploaded to the RDS
+    """
     raw_df['app_id'] = raw_df['app_id'].apply(store['app_id_method'])
     logging.info("Data about %s %s games downloaded from S3",
                  len(raw_df), store['store_name'])
 
-    existing_data = read_db_table_into_df('game', conn)
-    existing_data['game_id'] = pd.to_numeric(
-        existing_data['game_id'], errors='coerce').fillna(0).astype(int)
-    logging.info("Data about %s games downloaded from RDS", len(existing_data))
-    new_data = raw_df[~raw_df['app_id'].isin(existing_data['app_id'])].copy()
+    candidate_app_ids = raw_df['app_id'].astype(str)
+    new_app_ids = get_new_app_ids(conn, candidate_app_ids.unique().tolist())
+    new_data = raw_df[candidate_app_ids.isin(new_app_ids)].copy()
     logging.info("%s new games identified", len(new_data))
 
     store_translation = [
@@ -253,38 +366,17 @@ def transform_s3_steam_data(conn, store: dict[str]) -> dict[str:pd.DataFrame]:
     game_data = process_data(new_data, store_translation)
     logging.info("Game data transformed")
 
-    new_ids = get_game_id(len(new_data))
+    new_ids = get_game_id(conn, len(new_data))
     new_data["game_id"] = new_ids
 
     game_data["game_id"] = new_ids
 
-    genres = get_reference_data(
-        new_data, read_db_table_into_df('genre', conn), 'genre')
-    logging.info("Genre table generated")
-    publishers = get_reference_data(
-        new_data, read_db_table_into_df('publisher', conn), 'publisher')
-    logging.info("Publisher table generated")
-    developers = get_reference_data(
-        new_data, read_db_table_into_df('developer', conn), 'developer')
-    logging.info("Developer table generated")
-
-    genre_assignment_df = get_assignment_df(
-        new_data, 'game', 'genre', conn)
-    logging.info("Genre asssignment table generated")
-    publisher_assignment_df = get_assignment_df(
-        new_data, 'game', 'publisher', conn)
-    logging.info("Publisher asssignment table generated")
-    developer_assignment_df = get_assignment_df(
-        new_data, 'game', 'developer', conn)
-    logging.info("Developer asssignment table generated")
+    assignment_dfs = get_assignment_dfs(
+        new_data, 'game', ['genre', 'publisher', 'developer'], conn, known_ids)
+    logging.info("Assignment tables generated")
 
     return {
-        'genre': genres['new'],
-        'publisher': publishers['new'],
-        'developer': developers['new'],
-        'genre_assignment': genre_assignment_df,
-        'publisher_assignment': publisher_assignment_df,
-        'developer_assignment': developer_assignment_df,
+        **assignment_dfs,
         'game': game_data
     }
 
@@ -298,26 +390,19 @@ DB_URL = (
 )
 
 
+@cache
 def get_engine() -> Engine:
-    """Connects and returns engine to function"""
-
-    return create_engine(DB_URL, future=True)
-
-
-def upload_table(conn, df: pd.DataFrame, table: str, col: str) -> None:
-    """Insert each value of df to database"""
-
-    sql = text(f"""
-        INSERT INTO {table} ({col})
-        VALUES (:name)
-        ON CONFLICT ({col}) DO NOTHING
-    """)
-
-    for _, row in df.iterrows():
-        conn.execute(sql, {
-            "name": row[col],
-        })
-    logging.info("%s table uploaded", table)
+    """
+    Returns the pipeline's connection-pooled engine, created once per
+    process so warm lambda invocations reuse its open connections
+    """
+    return create_engine(
+        DB_URL,
+        future=True,
+        pool_size=len(stores),
+        pool_pre_ping=True,
+        pool_recycle=1800
+    )
 
 
 def upload_games(conn, games_df: pd.DataFrame) -> None:
@@ -350,6 +435,65 @@ def upload_games(conn, games_df: pd.DataFrame) -> None:
         })
 
 
+GAME_COLUMNS = [
+    "game_id", "game_name", "app_id", "store_id", "release_date", "image_url",
+    "game_description", "storage_requirements", "price", "currency", "game_url"
+]
+
+
+def to_copy_csv(df: pd.DataFrame) -> io.StringIO:
+    """
+    Writes a dataframe as CSV for COPY, quoting every value and leaving
+    nulls as unquoted empty fields, as quoted values never match
+    COPY's NULL marker whatever text they hold
+    """
+    csv_buffer = io.StringIO()
+    for row in df.itertuples(index=False):
+        csv_buffer.write(','.join(
+            '' if pd.isna(value) else '"' + str(value).replace('"', '""') + '"'
+            for value in row) + '\n')
+    csv_buffer.seek(0)
+    return csv_buffer
+
+
+def upload_games_bulk(conn, games_df: pd.DataFrame) -> dict[str:int]:
+    """
+    COPYs every game into a staging table and merges it into
+    the game table in one statement, skipping app_ids already present
+    """
+    csv_buffer = to_copy_csv(
+        games_df.rename(columns={"description": "game_description"})[GAME_COLUMNS])
+
+    # Schema qualified so only a staging table left by an earlier batch in
+    # this transaction can be dropped, never a permanent table of that name
+    conn.execute(text("DROP TABLE IF EXISTS pg_temp.game_staging"))
+    conn.execute(text("""
+        CREATE TEMP TABLE game_staging
+        (LIKE game INCLUDING DEFAULTS) ON COMMIT DROP
+    """))
+    cur = conn.connection.cursor()
+    try:
+        cur.copy_expert(
+            f"COPY pg_temp.game_staging ({', '.join(GAME_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            csv_buffer
+        )
+    finally:
+        cur.close()
+
+    result = conn.execute(text(f"""
+        INSERT INTO game ({', '.join(GAME_COLUMNS)})
+        SELECT {', '.join(GAME_COLUMNS)} FROM pg_temp.game_staging
+        ON CONFLICT (app_id) DO NOTHING
+    """))
+
+    inserted = result.rowcount
+    skipped = len(games_df) - inserted
+    logging.info("game table bulk loaded: %s inserted, %s skipped",
+                 inserted, skipped)
+    return {'inserted': inserted, 'skipped': skipped}
+
+
 def upload_assignments(conn, df: pd.DataFrame,
                        table: str,
                        left_foreign_key: str,
@@ -367,53 +511,95 @@ def upload_assignments(conn, df: pd.DataFrame,
     logging.info("%s table uploaded", table)
 
 
-def get_existing_game_ids(conn) -> set[int]:
-    """Gets set of all existing game ids"""
-    result = conn.execute(text("SELECT game_id FROM game"))
-    return set(row[0] for row in result.fetchall())
+def get_existing_game_ids(conn, game_ids: list[int]) -> set[int]:
+    """Gets the set of the given game ids that exist in the game table"""
+    existing = read_db_table_into_df(
+        'game', conn, ['game_id'], 'game_id = ANY(:game_ids)',
+        {"game_ids": [int(game_id) for game_id in game_ids]})
+    return set(existing['game_id'])
 
 
-def get_or_create_id(conn, table: str, name_col: str, name_val: str, id_col: str) -> int:
-    """Insert a name into a lookup table if it doesn't exist, then return its ID."""
-    insert_sql = text(f"""
-        INSERT INTO {table} ({name_col})
-        VALUES (:name_val)
-        ON CONFLICT ({name_col}) DO NOTHING;
+def upsert_reference_names(conn, table: str, names: list[str]) -> dict[str:int]:
+    """
+    Inserts every missing name into a lookup table in one statement
+    and returns the ID of each name passed in
+    """
+    name_col, id_col = f"{table}_name", f"{table}_id"
+    upsert_sql = text(f"""
+        WITH incoming AS (
+            SELECT DISTINCT unnest(CAST(:names AS TEXT[])) AS {name_col}
+        ), inserted AS (
+            INSERT INTO {table} ({name_col})
+            SELECT {name_col} FROM incoming
+            ORDER BY {name_col}
+            ON CONFLICT ({name_col}) DO NOTHING
+            RETURNING {id_col}, {name_col}
+        )
+        SELECT {id_col}, {name_col} FROM inserted
+        UNION ALL
+        SELECT {table}.{id_col}, {table}.{name_col}
+        FROM {table} JOIN incoming USING ({name_col});
     """)
-    conn.execute(insert_sql, {"name_val": name_val})
+    id_map = {row[1]: row[0]
+              for row in conn.execute(upsert_sql, {"names": names})}
+
+    # Names committed by a concurrent run while we waited on their lock
+    # are neither inserted nor visible to the statement's snapshot
+    missing = [name for name in names if name not in id_map]
+    if missing:
+        select_sql = text(f"""
+            SELECT {id_col}, {name_col}
+            FROM {table}
+            WHERE {name_col} = ANY(:names);
+        """)
+        id_map.update({row[1]: row[0]
+                       for row in conn.execute(select_sql, {"names": missing})})
+
+    return id_map
+
+
+def resolve_reference_ids(conn, table: str, names,
+                          known_ids: dict[str:dict] | None = None) -> dict[str:int]:
+    """
+    Returns the name to ID map of a lookup table covering every name passed in.
+    known_ids caches the maps resolved so far this run, so only unseen
+    names are sent to the database. They are upserted in a short transaction
+    of their own, so stores loading the same new names never hold each
+    other's row locks until their whole load commits
+    """
+    if known_ids is None:
+        known_ids = {}
+    id_map = known_ids.setdefault(table, {})
 
-    select_sql = text(f"""
-        SELECT {id_col}
-        FROM {table}
-        WHERE {name_col} = :name_val;
-    """)
-    result = conn.execute(select_sql, {"name_val": name_val}).fetchone()
+    unseen = sorted({str(name) for name in names} - id_map.keys())
+    if unseen:
+        with conn.engine.begin() as id_conn:
+            id_map.update(upsert_reference_names(id_conn, table, unseen))
+        logging.info("%s %s IDs resolved", len(unseen), table)
 
-    return result[0]
+    return id_map
 
 
 def load_data_into_database(conn, games_df: pd.DataFrame,
-                            publisher_df: pd.DataFrame,
-                            developer_df: pd.DataFrame,
-                            genre_df: pd.DataFrame,
                             genre_assignment_df,
                             developer_assignment_df,
-                            publisher_assignment_df) -> None:
-    """Loads all data into our database"""
+                            publisher_assignment_df,
+                            bulk: bool = False) -> None:
+    """
+    Loads all data into our database. Genre, publisher and developer
+    names were already upserted when their IDs were resolved
+    """
 
     games_df["app_id"] = games_df["app_id"].astype(str)
     games_df["price"] = games_df["price"].astype(int)
 
-    upload_table(conn, publisher_df, "publisher",
-                 "publisher_name")
-    upload_table(conn, developer_df, "developer",
-                 "developer_name")
-    upload_table(conn, genre_df, "genre", "genre_name")
-
-    upload_games(conn, games_df)
-    logging.info("game table uploaded")
+    if bulk:
+        upload_games_bulk(conn, games_df)
+    else:
+        upload_games(conn, games_df)
+        logging.info("game table uploaded")
 
-    existing_game_ids = get_existing_game_ids(conn)
+    existing_game_ids = get_existing_game_ids(conn, games_df["game_id"])
 
     genre_assignment_df = genre_assignment_df[
         genre_assignment_df["game_id"].isin(existing_game_ids)
@@ -455,24 +641,119 @@ stores = [
 ]
 
 
-def main():
+DEFAULT_RUN_OPTIONS = {
+    'bulk_load': False,
+    'full_rescan': False,
+    'concurrent': False,
+    'full_scan': False,
+    'window_days': DEFAULT_WINDOW_DAYS,
+    'ingest_date': None,
+    # Rows per batch to stream S3 data in, or True for one batch per file
+    'chunk_size': None
+}
+
+
+def get_run_options(event: dict | None) -> dict:
+    """Overrides the default run options with any set in the triggering event"""
+    options = dict(DEFAULT_RUN_OPTIONS)
+    if isinstance(event, dict):
+        options.update({key: event[key]
+                       for key in DEFAULT_RUN_OPTIONS if key in event})
+    return options
+
+
+def load_transformed_data(conn, store: dict, data: dict[str:pd.DataFrame],
+                          bulk: bool = False) -> None:
+    """Loads a store's transformed tables, unless there are no new games"""
+    if data['game'].empty:
+        logging.warning("No new game data for %s, skipping upload.", store)
+        return
+    load_data_into_database(
+        conn, data["game"],
+        data["genre_assignment"],
+        data["developer_assignment"],
+        data["publisher_assignment"],
+        bulk=bulk
+    )
+
+
+def process_store_in_batches(conn, store: dict, options: dict,
+                             known_ids: dict[str:dict],
+                             window_days: int | None) -> Exception | None:
+    """
+    Streams a store's unprocessed S3 objects chunk_size rows at a time,
+    transforming and loading each batch in its own savepoint so only one
+    batch is held in memory. known_ids carries the reference IDs between
+    batches, which stay valid after a rollback as they are committed when
+    resolved. If a batch fails, it is rolled back, the remaining batches
+    are skipped and its error is returned. The objects are then left
+    unprocessed, and the next run skips the games earlier batches loaded
+    """
+    new_objects = get_unprocessed_objects(
+        conn, store, options['full_rescan'], window_days, options['ingest_date'])
+    if not new_objects:
+        logging.info("No unprocessed S3 objects for %s", store['store_name'])
+        return None
+
+    batch = 0
+    try:
+        for batch, raw_df in enumerate(
+                wr.s3.read_parquet(new_objects, chunked=options['chunk_size']), 1):
+            with conn.begin_nested():
+                data = transform_raw_data(conn, store, raw_df, known_ids)
+                load_transformed_data(conn, store, data, options['bulk_load'])
+            logging.info("Batch %s of %s rows loaded for %s",
+                         batch, len(raw_df), store['store_name'])
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        logging.error("Batch %s for %s failed, leaving its S3 objects "
+                      "unprocessed: %s", batch + 1, store['store_name'], e)
+        return e
+    mark_objects_processed(conn, store['store_id'], new_objects)
+    return None
+
+
+def process_store(engine: Engine, store: dict,
+                  options: dict, known_ids: dict[str:dict]) -> None:
+    """
+    Transforms and loads one store's new data in its own transaction.
+    A failed batch is raised once the batches before it are committed
+    """
+    batch_error = None
+    with engine.connect() as conn:
+        with conn.begin():
+            window_days = None if options['full_scan'] else options['window_days']
+            if options['chunk_size']:
+                batch_error = process_store_in_batches(
+                    conn, store, options, known_ids, window_days)
+            else:
+                data = transform_s3_steam_data(
+                    conn, store, known_ids, options['full_rescan'],
+                    window_days, options['ingest_date'])
+                load_transformed_data(conn, store, data, options['bulk_load'])
+                mark_objects_processed(
+                    conn, store['store_id'], data['s3_objects'])
+    if batch_error:
+        raise batch_error
+    logging.info("%s processed", store['store_name'])
+
+
+def main(options: dict | None = None):
     """Main to run other functions"""
+    options = options or get_run_options(None)
     engine = get_engine()
-    for store in stores:
-        with engine.connect() as conn:
-            with conn.begin():
-                data = transform_s3_steam_data(conn, store)
-                if data['game'].empty:
-                    logging.warning(
-                        "No new game data for %s, skipping upload.", store)
-                    continue
-                load_data_into_database(
-                    conn, data["game"], data["publisher"],
-                    data["developer"], data["genre"],
-                    data["genre_assignment"],
-                    data["developer_assignment"],
-                    data["publisher_assignment"]
-                )
+    if options['concurrent']:
+        # Each store gets its own pooled connection and its own ID cache.
+        # Reference IDs are committed as they are resolved, so the stores
+        # only wait on each other for the length of one upsert
+        with ThreadPoolExecutor(max_workers=len(stores)) as executor:
+            futures = [executor.submit(process_store, engine, store, options, {})
+                       for store in stores]
+            for future in futures:
+                future.result()
+    else:
+        known_ids = {}
+        for store in stores:
+            process_store(engine, store, options, known_ids)
 
 
 if __name__ == "__main__":
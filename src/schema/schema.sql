@@ -13,6 +13,8 @@ DROP TABLE IF EXISTS publisher_assignment;
 
 DROP TABLE IF EXISTS game;
 
+DROP TABLE IF EXISTS processed_s3_object;
+
 DROP TABLE IF EXISTS store;
 
 DROP TABLE IF EXISTS genre;
@@ -89,6 +91,15 @@ CREATE TABLE publisher_assignment (
     FOREIGN KEY (game_id) REFERENCES game (game_id)
 );
 
+-- Raw S3 objects already transformed and loaded
+CREATE TABLE processed_s3_object (
+    processed_s3_object_id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    store_id INT NOT NULL,
+    object_key TEXT NOT NULL UNIQUE,
+    processed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (store_id) REFERENCES store (store_id)
+);
+
 -- Subscriber 
 CREATE TABLE subscriber (
     subscriber_id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
@@ -38,7 +38,8 @@ resource "aws_iam_policy" "lambda_policy" {
         Action = [
           "s3:ListBucket",
           "s3:GetObject",
-          "s3:PutObject"
+          "s3:PutObject",
+          "s3:DeleteObject"
         ]
         Resource = "*"
       }
@@ -223,6 +224,64 @@ resource "aws_cloudwatch_event_target" "tl_target" {
   arn       = aws_lambda_function.docker_lambda_tl.arn
 }
 
+# hourly runs only list recent ingest_date partitions, this catches the rest
+resource "aws_cloudwatch_event_rule" "tl_full_scan_schedule" {
+  name                = "c18-game-tracker-lambda-tl-full-scan-schedule"
+  schedule_expression = "cron(0 4 ? * SUN *)"
+}
+
+resource "aws_lambda_permission" "tl_full_scan_permission" {
+  statement_id  = "AllowExecutionFromEventBridgetlFullScan"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.docker_lambda_tl.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.tl_full_scan_schedule.arn
+}
+
+resource "aws_cloudwatch_event_target" "tl_full_scan_target" {
+  rule      = aws_cloudwatch_event_rule.tl_full_scan_schedule.name
+  target_id = "lambda-tl-full-scan"
+  arn       = aws_lambda_function.docker_lambda_tl.arn
+  input     = jsonencode({ full_scan = true })
+}
+
+
+# compaction lambda
+resource "aws_lambda_function" "docker_lambda_compaction" {
+  function_name = "c18-game-tracker-compaction-lambda"
+  package_type  = "Image"
+  image_uri     = var.lambda_image_uri_compaction
+  role          = aws_iam_role.lambda_exec_role_game_tracker_el.arn
+  timeout       = 900
+  memory_size   = 1024
+
+  environment {
+    variables = {
+      LOG_LEVEL = "INFO"
+    }
+  }
+}
+
+
+# Daily, clear of the hourly EL runs and the TL run at half past
+resource "aws_cloudwatch_event_rule" "compaction_schedule" {
+  name                = "c18-game-tracker-lambda-compaction-schedule"
+  schedule_expression = "cron(50 3 * * ? *)"
+}
+
+resource "aws_lambda_permission" "compaction_permission" {
+  statement_id  = "AllowExecutionFromEventBridgeCompaction"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.docker_lambda_compaction.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.compaction_schedule.arn
+}
+
+resource "aws_cloudwatch_event_target" "compaction_target" {
+  rule      = aws_cloudwatch_event_rule.compaction_schedule.name
+  target_id = "lambda-compaction"
+  arn       = aws_lambda_function.docker_lambda_compaction.arn
+}
 
 # Existing data
 data "aws_ecs_cluster" "existing" {
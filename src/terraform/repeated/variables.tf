@@ -4,6 +4,9 @@ variable "lambda_image_uri" {
 variable "lambda_image_uri_tl" {
   description = "ECR image tl URI"
 }
+variable "lambda_image_uri_compaction" {
+  description = "ECR image compaction URI"
+}
 variable "lambda_image_uri_notification" {
   description = "ECR image noti URI"
 }
@@ -0,0 +1,73 @@
+# pylint: skip-file
+"""
+Micro-benchmark comparing the scrapers' old full html.parser trees with
+make_soup, which builds only the tags each scraper reads, using every
+parser installed.
+
+Pages are the saved HTML from the Steam and GOG conftest fixtures. Run
+from the root of the repo with:
+`python -m tests.elt_pipeline.common.benchmark_html_parser`
+"""
+import importlib.util
+import sys
+import timeit
+from pathlib import Path
+from unittest.mock import patch
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).parents[3] / 'src/elt_pipeline/common'))
+
+import html_parser
+import tests.elt_pipeline.gog_el.conftest as gog_fixtures
+import tests.elt_pipeline.steam_el.conftest as steam_fixtures
+import src.elt_pipeline.gog_el.extract as gog_extract
+import src.elt_pipeline.steam_el.extract as steam_extract
+
+PARSERS = [parser for parser in ('html.parser', 'lxml')
+           if parser == 'html.parser' or importlib.util.find_spec(parser)]
+REPEATS = 5
+
+
+def load_fixture(fixture) -> str:
+    """Calls the function behind a pytest fixture to get its page"""
+    return getattr(fixture, '__wrapped__', fixture)()
+
+
+CASES = [
+    ('steam search', steam_extract, steam_extract.parse_games_bs,
+     load_fixture(steam_fixtures.example_two_games_html)),
+    ('gog new releases', gog_extract, gog_extract.parse_games_bs,
+     load_fixture(gog_fixtures.example_gog_new_releases)),
+    ('gog game page', gog_extract, gog_extract.get_gog_game_details,
+     load_fixture(gog_fixtures.example_gog_game_page)),
+]
+
+
+def full_tree(html: str, only=None, parser=None) -> BeautifulSoup:
+    """The previous parsing, building the whole page with html.parser"""
+    return BeautifulSoup(html, "html.parser")
+
+
+def time_scraper(scraper, html: str) -> float:
+    """Best time in seconds to scrape a page once"""
+    return min(timeit.repeat(lambda: scraper(html), number=1, repeat=REPEATS))
+
+
+def main():
+    """Times each scraper with each parser and prints the speedup"""
+    print(f"{'page':>17} {'kB':>5} {'parser':>12} {'full tree (s)':>14} "
+          f"{'strained (s)':>13} {'speedup':>8}")
+    for name, module, scraper, html in CASES:
+        with patch.object(module, 'make_soup', full_tree):
+            expected = scraper(html)
+            old = time_scraper(scraper, html)
+        for parser in PARSERS:
+            with patch.object(html_parser, 'HTML_PARSER', parser):
+                assert scraper(html) == expected, (name, parser)
+                new = time_scraper(scraper, html)
+            print(f"{name:>17} {len(html) // 1000:>5} {parser:>12} {old:>14.4f} "
+                  f"{new:>13.4f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
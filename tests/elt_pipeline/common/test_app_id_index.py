@@ -0,0 +1,63 @@
+# pylint: skip-file
+"""
+This module tests the app_id index shared by the extract pipelines
+"""
+
+from unittest.mock import MagicMock, patch
+import awswrangler as wr
+import pandas as pd
+from app_id_index import add_to_app_id_index, get_index_path, get_indexed_app_ids
+
+DATASET_PATH = "s3://bucket/input/steam/"
+INDEX_PATH = "s3://bucket/index/steam/app_ids.parquet"
+
+
+def test_get_index_path_is_outside_dataset():
+    """
+    Tests the index is kept under its own prefix, named after the store.
+    """
+    assert get_index_path(DATASET_PATH) == INDEX_PATH
+    assert get_index_path("s3://bucket/input/gog") == "s3://bucket/index/gog/app_ids.parquet"
+
+
+@patch('awswrangler.s3.to_parquet')
+@patch('awswrangler.s3.read_parquet')
+def test_get_indexed_app_ids_reads_only_index(mock_read_parquet, mock_to_parquet):
+    """
+    Tests an existing index is read on its own, without scanning the dataset.
+    """
+    mock_read_parquet.return_value = pd.DataFrame({'app_id': ['1', '2']})
+
+    assert get_indexed_app_ids(DATASET_PATH, None) == {'1', '2'}
+    mock_read_parquet.assert_called_once()
+    assert mock_read_parquet.call_args.args[0] == INDEX_PATH
+    mock_to_parquet.assert_not_called()
+
+
+@patch('awswrangler.s3.to_parquet')
+@patch('awswrangler.s3.read_parquet')
+def test_get_indexed_app_ids_builds_missing_index(mock_read_parquet, mock_to_parquet):
+    """
+    Tests a missing index is built from the dataset and written sorted.
+    """
+    mock_read_parquet.side_effect = [wr.exceptions.NoFilesFound("missing"),
+                                     pd.DataFrame({'app_id': [30, 4, 30]})]
+
+    assert get_indexed_app_ids(DATASET_PATH, None) == {'30', '4'}
+    assert mock_read_parquet.call_args.args[0] == DATASET_PATH
+    written = mock_to_parquet.call_args.args
+    assert written[0]['app_id'].tolist() == ['30', '4']
+    assert written[1] == INDEX_PATH
+
+
+@patch('awswrangler.s3.to_parquet')
+def test_add_to_app_id_index_writes_only_new_app_ids(mock_to_parquet):
+    """
+    Tests the index is rewritten with new app_ids, and left alone when there are none.
+    """
+    add_to_app_id_index(DATASET_PATH, {'1', '3'}, [2, '3'], None)
+    assert mock_to_parquet.call_args.args[0]['app_id'].tolist() == ['1', '2', '3']
+
+    mock_to_parquet.reset_mock()
+    add_to_app_id_index(DATASET_PATH, {'1', '3'}, ['3'], None)
+    mock_to_parquet.assert_not_called()
@@ -0,0 +1,80 @@
+# pylint: skip-file
+"""
+This module tests the compaction manifest shared by the dataset readers
+"""
+
+import io
+import json
+from unittest.mock import MagicMock
+from compaction_manifest import (get_ingest_date, get_live_objects, get_manifest_path,
+                                 read_compaction_manifest, read_compaction_manifests)
+
+PARTITION = "s3://bucket/input/gog/year=2024/month=3/day=20/"
+
+
+def test_get_manifest_path_is_beside_indexes():
+    """
+    Tests the manifest is kept with the store's indexes, outside its dataset.
+    """
+    assert get_manifest_path("s3://bucket/input/gog/") == \
+        "s3://bucket/index/gog/compaction_manifest.json"
+    assert get_manifest_path("s3://bucket/input/gog/", "2024-03-22") == \
+        "s3://bucket/index/gog/compaction_manifest/ingest_date=2024-03-22.json"
+
+
+def test_get_ingest_date_reads_partition_folder():
+    """
+    Tests a file's ingest date comes from its partition, and is None outside one.
+    """
+    assert get_ingest_date("s3://bucket/input/gog/ingest_date=2024-03-22/"
+                           "year=2024/month=3/day=20/a.parquet") == "2024-03-22"
+    assert get_ingest_date(PARTITION + "a.parquet") is None
+
+
+def test_get_live_objects_skips_replaced_and_unrecorded_files():
+    """
+    Tests replaced files and compacted files missing from the manifest are dropped.
+    """
+    manifest = {PARTITION + "compacted-1.parquet": [PARTITION + "a.parquet"]}
+    listed = [PARTITION + "a.parquet", PARTITION + "b.parquet",
+              PARTITION + "compacted-1.parquet", PARTITION + "compacted-2.parquet"]
+
+    assert get_live_objects(listed, manifest) == [
+        PARTITION + "b.parquet", PARTITION + "compacted-1.parquet"]
+
+
+def test_read_compaction_manifest_is_empty_before_compaction():
+    """
+    Tests a missing manifest reads as no compactions, and a stored one is parsed.
+    """
+    session = MagicMock()
+    client = session.client.return_value
+    client.exceptions.NoSuchKey = KeyError
+    client.get_object.side_effect = KeyError("missing")
+
+    assert read_compaction_manifest("s3://bucket/input/gog/", session) == {}
+
+    client.get_object.side_effect = None
+    client.get_object.return_value = {'Body': io.BytesIO(json.dumps({'c': ['a']}).encode())}
+    assert read_compaction_manifest("s3://bucket/input/gog/", session) == {'c': ['a']}
+    assert client.get_object.call_args.kwargs == {
+        'Bucket': 'bucket', 'Key': 'index/gog/compaction_manifest.json'}
+
+
+def test_read_compaction_manifests_merges_listed_days_only():
+    """
+    Tests only the shards of the listed files' ingest dates are read, then merged.
+    """
+    session = MagicMock()
+    client = session.client.return_value
+    shards = {'index/gog/compaction_manifest/ingest_date=2024-03-21.json': {'c1': ['a']},
+              'index/gog/compaction_manifest/ingest_date=2024-03-22.json': {'c2': ['b']}}
+    client.get_object.side_effect = lambda Bucket, Key: {
+        'Body': io.BytesIO(json.dumps(shards[Key]).encode())}
+    listed = ["s3://bucket/input/gog/ingest_date=2024-03-22/year=2024/month=3/day=20/b.parquet",
+              "s3://bucket/input/gog/ingest_date=2024-03-21/year=2024/month=3/day=20/a.parquet",
+              "s3://bucket/input/gog/ingest_date=2024-03-22/year=2024/month=3/day=21/d.parquet"]
+
+    assert read_compaction_manifests("s3://bucket/input/gog/", listed, session) == {
+        'c1': ['a'], 'c2': ['b']}
+    assert client.get_object.call_count == 2
@@ -0,0 +1,31 @@
+# pylint: skip-file
+"""
+This module tests the HTML parsing shared by the scrapers
+"""
+
+import pytest
+from html_parser import class_strainer, make_soup
+
+HTML = ('<div class="page"><h1 class="title main">Game</h1>'
+        '<span class="price">1.99</span><p class="price-note">VAT</p></div>')
+
+
+@pytest.mark.parametrize('parser', ['html.parser', 'lxml'])
+def test_class_strainer_builds_only_matching_tags(parser):
+    """
+    Tests class_strainer keeps tags with any of the classes, matched as whole words.
+    """
+    soup = make_soup(HTML, class_strainer('main', 'price'), parser)
+
+    assert [tag.name for tag in soup.find_all()] == ['h1', 'span']
+    assert soup.find('h1', class_='title').get_text() == 'Game'
+
+
+def test_make_soup_without_strainer_builds_whole_page():
+    """
+    Tests make_soup parses every tag when no strainer is given.
+    """
+    soup = make_soup(HTML)
+
+    assert [tag.name for tag in soup.find_all(['div', 'h1', 'span', 'p'])] == [
+        'div', 'h1', 'span', 'p']
@@ -0,0 +1,113 @@
+# pylint: skip-file
+"""
+This module tests the HTTP client shared by the extract pipelines
+"""
+
+import logging
+import os
+import time
+import pytest
+import requests
+from http_client import (HTTP_TIMEOUT, POOL_MAXSIZE, get_cache_path, get_cached,
+                         get_html, get_http_session, log_cache_stats, prune_cache)
+
+
+def test_get_http_session_pools_and_times_out(requests_mock):
+    """
+    Tests sessions keep a large connection pool and send requests with the default timeout.
+    """
+    requests_mock.get("https://example.com/page", text="ok")
+    session = get_http_session()
+
+    session.get("https://example.com/page")
+
+    assert session.get_adapter("https://example.com")._pool_maxsize == POOL_MAXSIZE
+    assert requests_mock.last_request.timeout == HTTP_TIMEOUT
+    assert "gzip" in requests_mock.last_request.headers["Accept-Encoding"]
+
+
+def test_get_html_decodes_page(requests_mock):
+    """
+    Tests get_html returns the decoded body of a page.
+    """
+    requests_mock.get("https://example.com/page", content="café".encode())
+
+    assert get_html("https://example.com/page") == "café"
+
+
+def test_get_html_raises_on_http_error(requests_mock):
+    """
+    Tests get_html raises when the page returns an error status.
+    """
+    requests_mock.get("https://example.com/missing", status_code=404)
+
+    with pytest.raises(requests.HTTPError):
+        get_html("https://example.com/missing")
+
+
+def test_get_cached_reuses_fresh_responses(requests_mock, caplog):
+    """
+    Tests responses younger than the TTL are served from the cache without a request.
+    """
+    requests_mock.get("https://example.com/api", json={'a': 1})
+
+    first = get_cached("https://example.com/api", 60)
+    second = get_cached("https://example.com/api", 60)
+
+    assert first.json() == second.json() == {'a': 1}
+    assert requests_mock.call_count == 1
+    with caplog.at_level(logging.INFO):
+        log_cache_stats()
+    assert "1 hits, 0 revalidated, 1 misses" in caplog.text
+
+
+def test_get_cached_revalidates_stale_responses(requests_mock):
+    """
+    Tests stale responses are revalidated with their validators, and reused on a 304.
+    """
+    requests_mock.get("https://example.com/page", text="old", headers={
+        'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+    get_cached("https://example.com/page", 0)
+
+    requests_mock.get("https://example.com/page", status_code=304)
+    response = get_cached("https://example.com/page", 0)
+
+    assert response.status_code == 200
+    assert response.text == "old"
+    headers = requests_mock.last_request.headers
+    assert headers['If-None-Match'] == '"v1"'
+    assert headers['If-Modified-Since'] == 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+
+def test_get_cached_does_not_store_errors(requests_mock):
+    """
+    Tests error responses are returned but never cached.
+    """
+    requests_mock.get("https://example.com/missing", status_code=404)
+
+    assert get_cached("https://example.com/missing", 60).status_code == 404
+    assert get_cached("https://example.com/missing", 60).status_code == 404
+    assert requests_mock.call_count == 2
+
+
+def test_prune_cache_evicts_old_then_least_recently_refreshed(requests_mock):
+    """
+    Tests entries past the maximum age are evicted, then the least recently
+    refreshed ones until the cache fits in the byte cap.
+    """
+    urls = [f"https://example.com/{name}" for name in ('old', 'older', 'newer', 'newest')]
+    for url in urls:
+        requests_mock.get(url, text="x" * 100)
+        get_cached(url, 60)
+    now = time.time()
+    for url, age in zip(urls, (10 * 24 * 3600, 60, 30, 0)):
+        for suffix in ('.json', '.body'):
+            os.utime(get_cache_path(url) + suffix, (now - age, now - age))
+    entry_bytes = sum(os.path.getsize(get_cache_path(urls[3]) + suffix)
+                      for suffix in ('.json', '.body'))
+
+    prune_cache(max_age=7 * 24 * 3600, max_bytes=2 * entry_bytes + 10)
+
+    cached = {url for url in urls if os.path.exists(get_cache_path(url) + '.json')}
+    assert cached == {urls[2], urls[3]}
+    assert not os.path.exists(get_cache_path(urls[0]) + '.body')
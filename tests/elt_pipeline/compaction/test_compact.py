@@ -0,0 +1,86 @@
+# pylint: skip-file
+import pandas as pd
+from unittest.mock import MagicMock, patch
+import src.elt_pipeline.compaction.compact as compactor
+
+PARTITION = "s3://c18-game-tracker-s3/input/steam/ingest_date=2024-03-22/year=2024/month=3/day=20"
+OTHER_PARTITION = "s3://c18-game-tracker-s3/input/steam/ingest_date=2024-03-22/year=2024/month=3/day=21"
+
+
+def test_get_partitions_groups_files_by_folder():
+    result = compactor.get_partitions([
+        f"{PARTITION}/a.parquet", f"{OTHER_PARTITION}/b.parquet", f"{PARTITION}/c.parquet"])
+
+    assert result == {PARTITION: [f"{PARTITION}/a.parquet", f"{PARTITION}/c.parquet"],
+                      OTHER_PARTITION: [f"{OTHER_PARTITION}/b.parquet"]}
+
+
+@patch("src.elt_pipeline.compaction.compact.wr.s3.read_parquet_metadata",
+       return_value=({'app_id': 'bigint', 'title': 'string'}, {}))
+@patch("src.elt_pipeline.compaction.compact.wr.s3.to_parquet")
+@patch("src.elt_pipeline.compaction.compact.wr.s3.read_parquet")
+def test_compact_partition_writes_one_sorted_file(mock_read_parquet, mock_to_parquet,
+                                                  mock_read_metadata):
+    mock_read_parquet.side_effect = [pd.DataFrame({'app_id': [30, 4], 'title': ['c', 'a']}),
+                                     pd.DataFrame({'app_id': [100], 'title': ['b']})]
+
+    path = compactor.compact_partition(
+        PARTITION, [f"{PARTITION}/a.parquet", f"{PARTITION}/b.parquet"], None)
+
+    assert path.startswith(f"{PARTITION}/compacted-")
+    df, written_path = mock_to_parquet.call_args.args
+    assert written_path == path
+    assert df['app_id'].tolist() == [100, 30, 4]
+    assert mock_to_parquet.call_args.kwargs['compression'] == 'zstd'
+    assert mock_to_parquet.call_args.kwargs['dtype'] == {'app_id': 'bigint', 'title': 'string'}
+
+
+@patch("src.elt_pipeline.compaction.compact.wr.s3.delete_objects")
+@patch("src.elt_pipeline.compaction.compact.compact_partition")
+@patch("src.elt_pipeline.compaction.compact.write_compaction_manifest")
+@patch("src.elt_pipeline.compaction.compact.wr.s3.list_objects")
+@patch("src.elt_pipeline.compaction.compact.read_compaction_manifest")
+def test_compact_store_records_compactions_before_deleting(
+        mock_read_manifest, mock_list_objects, mock_write_manifest,
+        mock_compact_partition, mock_delete_objects):
+    old_compaction = {f"{OTHER_PARTITION}/compacted-old.parquet": [f"{OTHER_PARTITION}/x.parquet"]}
+    mock_read_manifest.return_value = dict(old_compaction)
+    mock_list_objects.return_value = [
+        f"{PARTITION}/a.parquet", f"{PARTITION}/b.parquet",
+        f"{PARTITION}/compacted-orphan.parquet",
+        f"{OTHER_PARTITION}/compacted-old.parquet", f"{OTHER_PARTITION}/x.parquet"]
+    mock_compact_partition.return_value = f"{PARTITION}/compacted-new.parquet"
+    calls = MagicMock()
+    calls.attach_mock(mock_write_manifest, 'write_manifest')
+    calls.attach_mock(mock_delete_objects, 'delete_objects')
+
+    result = compactor.compact_store('steam', None)
+
+    new_compaction = {f"{PARTITION}/compacted-new.parquet":
+                      [f"{PARTITION}/a.parquet", f"{PARTITION}/b.parquet"]}
+    assert result == new_compaction
+    mock_compact_partition.assert_called_once_with(
+        PARTITION, [f"{PARTITION}/a.parquet", f"{PARTITION}/b.parquet"], None)
+    assert [call[0] for call in calls.mock_calls] == [
+        'delete_objects', 'write_manifest', 'delete_objects']
+    assert calls.mock_calls[0].args[0] == [f"{PARTITION}/compacted-orphan.parquet"]
+    mock_read_manifest.assert_called_once_with(
+        "s3://c18-game-tracker-s3/input/steam/", None, "2024-03-22")
+    assert calls.mock_calls[1].args[1] == old_compaction | new_compaction
+    assert calls.mock_calls[1].args[3] == "2024-03-22"
+    assert calls.mock_calls[2].args[0] == [f"{PARTITION}/a.parquet", f"{PARTITION}/b.parquet"]
+
+
+@patch("src.elt_pipeline.compaction.compact.compact_partition")
+@patch("src.elt_pipeline.compaction.compact.wr.s3.list_objects")
+@patch("src.elt_pipeline.compaction.compact.read_compaction_manifest")
+def test_compact_store_skips_days_with_one_file_per_partition(
+        mock_read_manifest, mock_list_objects, mock_compact_partition):
+    compacted_day = "s3://c18-game-tracker-s3/input/steam/ingest_date=2024-03-01/year=2024/month=2/day=1"
+    mock_read_manifest.return_value = {}
+    mock_list_objects.return_value = [
+        f"{compacted_day}/compacted-old.parquet", f"{PARTITION}/a.parquet"]
+
+    assert compactor.compact_store('steam', None) == {}
+    mock_read_manifest.assert_not_called()
+    mock_compact_partition.assert_not_called()
@@ -0,0 +1,22 @@
+# pylint: skip-file
+"""
+Puts the modules shared by the extract pipelines on the import path,
+as they sit next to each handler inside the lambda images, and gives
+each test its own empty HTTP response cache.
+"""
+
+import sys
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[2] / 'src' / 'elt_pipeline' / 'common'))
+
+
+@pytest.fixture(autouse=True)
+def http_cache_dir(tmp_path, monkeypatch):
+    """Points the HTTP response cache at a directory only this test uses."""
+    import http_client
+    monkeypatch.setattr(http_client, 'CACHE_DIR', str(tmp_path / 'http_cache'))
+    monkeypatch.setattr(http_client, 'CACHE_STATS',
+                        {'hits': 0, 'revalidated': 0, 'misses': 0})
+    return tmp_path / 'http_cache'
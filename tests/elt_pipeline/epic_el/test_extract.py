@@ -4,6 +4,7 @@ from unittest.mock import patch, MagicMock
 from datetime import datetime
 
 import src.elt_pipeline.epic_el.extract as scraper
+import http_client
 
 
 def test_get_session_valid_credentials():
@@ -20,19 +21,17 @@ def test_get_session_missing_credentials():
             scraper.get_session()
 
 
-def test_get_existing_games_returns_list():
-    mock_df = MagicMock()
-    mock_df.__getitem__.return_value.astype.return_value.tolist.return_value = [
-        'game1', 'game2']
-    with patch("src.elt_pipeline.epic_el.extract.wr.s3.read_parquet", return_value=mock_df):
+def test_get_existing_games_returns_set():
+    with patch("src.elt_pipeline.epic_el.extract.get_indexed_app_ids",
+               return_value={'game1', 'game2'}):
         result = scraper.get_existing_games("dummy-path", MagicMock())
-        assert result == ['game1', 'game2']
+        assert result == {'game1', 'game2'}
 
 
-def test_get_existing_games_handles_error():
-    with patch("src.elt_pipeline.epic_el.extract.wr.s3.read_parquet", side_effect=Exception("error")):
-        result = scraper.get_existing_games("dummy-path", MagicMock())
-        assert result == []
+def test_get_existing_games_raises_read_errors():
+    with patch("src.elt_pipeline.epic_el.extract.get_indexed_app_ids", side_effect=Exception("error")):
+        with pytest.raises(Exception, match="error"):
+            scraper.get_existing_games("dummy-path", MagicMock())
 
 
 def test_fetch_game_with_release_check_valid_date():
@@ -40,7 +39,7 @@ def test_fetch_game_with_release_check_valid_date():
         'app_id': 'abc123',
         'url': 'https://store.epicgames.com/en-US/p/fake-game'
     }
-    fake_product_map = {'namespace1': 'fake-game'}
+    fake_slug_namespaces = {'fake-game': 'namespace1'}
     release_date = datetime(2024, 3, 20).isoformat()
 
     with patch("src.elt_pipeline.epic_el.extract.get_epic_game_details", return_value={
@@ -57,7 +56,7 @@ def test_fetch_game_with_release_check_valid_date():
         'image': ''
     }):
         result = scraper.fetch_game_with_release_check(
-            fake_item, fake_product_map, datetime(2024, 3, 20).date())
+            fake_item, fake_slug_namespaces, datetime(2024, 3, 20).date())
         assert result is not None
         assert result['app_id'] == 'abc123'
 
@@ -67,9 +66,126 @@ def test_fetch_game_with_release_check_invalid_date():
         'app_id': 'abc123',
         'url': 'https://store.epicgames.com/en-US/p/fake-game'
     }
-    fake_product_map = {'namespace1': 'fake-game'}
+    fake_slug_namespaces = {'fake-game': 'namespace1'}
 
     with patch("src.elt_pipeline.epic_el.extract.get_epic_game_details", return_value={'release': '2022-01-01T00:00:00.000Z', 'app_id': 'abc123'}):
         result = scraper.fetch_game_with_release_check(
-            fake_item, fake_product_map, datetime(2024, 3, 20).date())
+            fake_item, fake_slug_namespaces, datetime(2024, 3, 20).date())
         assert result is None
+
+
+def test_get_product_mapping_downloads_and_caches(requests_mock):
+    requests_mock.get(scraper.PRODUCT_MAPPING_URL, json={'ns1': 'game-one'},
+                      headers={'ETag': '"v1"'})
+
+    assert scraper.get_product_mapping() == {'ns1': 'game-one'}
+    assert scraper.get_product_mapping() == {'ns1': 'game-one'}
+    assert requests_mock.call_count == 1
+
+
+def test_get_product_mapping_revalidates_stale_cache(requests_mock, monkeypatch):
+    requests_mock.get(scraper.PRODUCT_MAPPING_URL, json={'ns1': 'game-one'},
+                      headers={'ETag': '"v1"'})
+    scraper.get_product_mapping()
+    monkeypatch.setattr(scraper, 'PRODUCT_MAPPING_TTL', 0)
+    requests_mock.get(scraper.PRODUCT_MAPPING_URL, status_code=304)
+
+    assert scraper.get_product_mapping() == {'ns1': 'game-one'}
+    assert requests_mock.last_request.headers['If-None-Match'] == '"v1"'
+
+    requests_mock.get(scraper.PRODUCT_MAPPING_URL, json={'ns2': 'game-two'},
+                      headers={'ETag': '"v2"'})
+    assert scraper.get_product_mapping() == {'ns2': 'game-two'}
+
+
+def catalog_response(offer_id, release='2024-03-20T00:00:00.000Z'):
+    return {'data': {'Catalog': {'catalogOffer': {
+        'id': offer_id, 'releaseDate': release, 'tags': [{'name': 'Action'}],
+        'customAttributes': [{'key': 'developerName', 'value': 'Dev'}],
+        'price': {'totalPrice': {'discountPrice': 999, 'currencyCode': 'GBP'}}}}}}
+
+
+def test_iterate_through_scraped_games_looks_up_namespace_by_slug():
+    items = [{'app_id': 'offer1', 'url': 'https://store.epicgames.com/en-US/p/game-one'}]
+    with patch.object(scraper.api, 'get_offers_data',
+                      return_value=[catalog_response('offer1')]) as mock_offers:
+        result = scraper.iterate_through_scraped_games(
+            items, datetime(2024, 3, 20).date(), {'ns1': 'game-one', 'ns2': 'game-two'})
+    offer, = mock_offers.call_args.args
+    assert (offer.namespace, offer.offer_id) == ('ns1', 'offer1')
+    assert result[0]['developers'] == ['Dev']
+    assert result[0]['url'] == items[0]['url']
+
+
+def test_get_offers_details_batches_and_falls_back_to_single_lookups(monkeypatch):
+    items = [{'app_id': f'offer{i}', 'url': f'https://store.epicgames.com/en-US/p/game-{i}'}
+             for i in range(5)]
+
+    def get_offers_data(*offers):
+        if len(offers) == 1:
+            return [catalog_response(offers[0].offer_id)]
+        # offer1 fails inside its batch, and offer2 is cut off the end of the response
+        return [None if offer.offer_id == 'offer1' else catalog_response(offer.offer_id)
+                for offer in offers[:2]]
+
+    with patch.object(scraper.api, 'get_offers_data', side_effect=get_offers_data) as mock_offers:
+        result = scraper.get_offers_details(items, {}, batch_size=3)
+
+    assert [game['app_id'] for game in result] == [f'offer{i}' for i in range(5)]
+    assert [game['title'] for game in result] == [f'game-{i}' for i in range(5)]
+    batch_sizes = sorted(len(call.args) for call in mock_offers.call_args_list)
+    assert batch_sizes == [1, 1, 2, 3]
+
+
+def test_get_epic_game_summaries_skips_known_offers(requests_mock):
+    requests_mock.get(scraper.EPIC_PRODUCT_URL + 'new-game', json={'pages': [
+        {'offer': {'id': 'offer1'}}, {'offer': {}}, {'_title': 'no offer'}]})
+    requests_mock.get(scraper.EPIC_PRODUCT_URL + 'old-game', json={'pages': [
+        {'offer': {'id': 'offer2'}}, {'offer': {'id': 'offer3'}}]})
+    requests_mock.get(scraper.EPIC_PRODUCT_URL + 'missing-game', status_code=404)
+
+    result = scraper.get_epic_game_summaries(
+        {'ns1': 'new-game', 'ns2': 'old-game', 'ns3': 'missing-game'},
+        {'offer2'})
+
+    assert result == [{'app_id': 'offer1',
+                       'url': 'https://store.epicgames.com/en-US/p/new-game',
+                       'title': 'new-game'},
+                      {'app_id': 'offer3',
+                       'url': 'https://store.epicgames.com/en-US/p/old-game',
+                       'title': 'old-game'}]
+
+
+def test_get_product_offers_retries_server_errors(requests_mock, monkeypatch):
+    monkeypatch.setattr(http_client, 'BACKOFF_SECONDS', 0)
+    requests_mock.get(scraper.EPIC_PRODUCT_URL + 'game', [
+        {'status_code': 503}, {'json': {'pages': [{'offer': {'id': 'offer1'}}]}}])
+
+    assert [offer['app_id'] for offer in scraper.get_product_offers('game')] == ['offer1']
+    assert requests_mock.call_count == 2
+
+
+def test_get_release_candidates_pages_through_search(monkeypatch):
+    monkeypatch.setattr(scraper, 'CANDIDATE_PAGE_SIZE', 2)
+    elements = [
+        {'id': 'offer1', 'namespace': 'ns1', 'productSlug': 'game-one/home'},
+        {'id': 'offer2', 'namespace': 'ns2', 'productSlug': None, 'urlSlug': 'game-two'},
+        {'id': 'offer3', 'namespace': 'ns3', 'productSlug': None, 'urlSlug': None}]
+
+    def fetch_store_games(count, start, **kwargs):
+        return {'data': {'Catalog': {'searchStore': {
+            'elements': elements[start:start + count],
+            'paging': {'count': count, 'total': len(elements)}}}}}
+
+    with patch.object(scraper.api, 'fetch_store_games',
+                      side_effect=fetch_store_games) as mock_search:
+        summaries, product_map = scraper.get_release_candidates(datetime(2024, 3, 20).date())
+
+    assert summaries == [
+        {'app_id': 'offer1', 'url': 'https://store.epicgames.com/en-US/p/game-one', 'title': 'game-one'},
+        {'app_id': 'offer2', 'url': 'https://store.epicgames.com/en-US/p/game-two', 'title': 'game-two'}]
+    assert product_map == {'ns1': 'game-one', 'ns2': 'game-two'}
+    assert mock_search.call_count == 2
+    kwargs = mock_search.call_args.kwargs
+    assert kwargs['sort_by'] == 'releaseDate'
+    assert kwargs['release_date'] == '[2024-03-19T00:00:00.000Z, 2024-03-22T00:00:00.000Z]'
@@ -3,13 +3,17 @@
 This module tests functions used during the extraction of gog data via scraping and the api
 """
 
-from src.elt_pipeline.gog_el.extract import get_gog_game_details, parse_games_bs, iterate_through_scraped_games
+from src.elt_pipeline.gog_el.extract import get_gog_game_details, parse_games_bs, iterate_through_scraped_games, crawl_new_releases, GOG_CATALOG_URL
+import pytest
 from unittest.mock import patch
 from datetime import date
 import requests_mock
 import pandas as pd
 import awswrangler as wr
 import requests as req
+from bs4 import BeautifulSoup
+import html_parser
+import src.elt_pipeline.gog_el.extract as gog_extract
 
 
 def test_gog_parse_games_bs_valid_data(example_gog_new_releases):
@@ -56,3 +60,92 @@ def test_get_gog_game_details_success(example_gog_game_page):
     assert result['genres'] == ['Adventure', 'Simulation', 'Exploration']
     assert result['title'] == 'Sengoku Dynasty'
     assert result['release'] == date(2024, 11, 7)
+
+
+@pytest.mark.parametrize('parser', ['html.parser', 'lxml'])
+@pytest.mark.parametrize('scraper, page', [
+    (parse_games_bs, 'example_gog_new_releases'),
+    (get_gog_game_details, 'example_gog_game_page')])
+def test_gog_scrapers_match_full_page_parse(scraper, page, parser, request):
+    """
+    Tests the scrapers give the same output parsing only the tags they read as parsing the whole page.
+    """
+    html = request.getfixturevalue(page)
+    with patch.object(gog_extract, 'make_soup',
+                      lambda html, only=None: BeautifulSoup(html, 'html.parser')):
+        expected = scraper(html)
+
+    with patch.object(html_parser, 'HTML_PARSER', parser):
+        assert scraper(html) == expected
+
+
+def test_iterate_through_scraped_games_skips_bad_pages(example_gog_game_page):
+    """
+    Tests iterate_through_scraped_games keeps the good pages in order when
+    other pages fail to download or parse.
+    """
+    pages = {
+        'https://www.gog.com/en/game/good': example_gog_game_page,
+        'https://www.gog.com/en/game/broken': '<html><body></body></html>'
+    }
+
+    def fake_get_html(url, cache_ttl=None):
+        if url not in pages:
+            raise req.HTTPError('404 Client Error')
+        return pages[url]
+
+    game_list = [
+        {'url': 'https://www.gog.com/en/game/missing', 'app_id': '1'},
+        {'url': 'https://www.gog.com/en/game/good', 'app_id': '2'},
+        {'url': 'https://www.gog.com/en/game/broken', 'app_id': '3'},
+        {'url': None, 'app_id': '4'}
+    ]
+
+    with patch('src.elt_pipeline.gog_el.extract.get_html', side_effect=fake_get_html):
+        result = iterate_through_scraped_games(game_list)
+
+    assert len(result) == 1
+    assert result[0]['app_id'] == '2'
+    assert result[0]['title'] == 'Sengoku Dynasty'
+
+
+def catalog_page(app_ids):
+    """Builds a GOG catalog API response listing the given products"""
+    return {'products': [{
+        'id': app_id,
+        'storeLink': f'https://www.gog.com/en/game/game_{app_id}',
+        'coverHorizontal': f'https://images.gog-statics.com/hash{app_id}.png'
+    } for app_id in app_ids]}
+
+
+def test_crawl_new_releases_stops_at_known_page(requests_mock):
+    """
+    Tests crawl_new_releases walks catalog pages until a page of known games.
+    """
+    for page, app_ids in enumerate([['1', '2'], ['3', '4'], ['5', '6'], ['7'], ['8']], start=1):
+        requests_mock.get(f'{GOG_CATALOG_URL}?page={page}',
+                          json=catalog_page(app_ids))
+
+    result = crawl_new_releases({'4', '5', '6', '7'}, max_pages=5)
+
+    assert [game['app_id'] for game in result] == ['1', '2', '3', '4']
+    assert result[0] == {
+        'url': 'https://www.gog.com/en/game/game_1',
+        'app_id': '1',
+        'image': 'https://images.gog-statics.com/hash1_product_tile_extended_432x243_2x.webp'
+    }
+    requested_pages = {request.qs['page'][0]
+                       for request in requests_mock.request_history}
+    assert requested_pages == {'1', '2', '3'}
+
+
+def test_crawl_new_releases_respects_max_pages(requests_mock):
+    """
+    Tests crawl_new_releases stops after max_pages when every game is new.
+    """
+    requests_mock.get(GOG_CATALOG_URL, json=catalog_page(['1']))
+
+    result = crawl_new_releases(set(), max_pages=2)
+
+    assert len(result) == 2
+    assert requests_mock.call_count == 2
@@ -3,6 +3,11 @@
 Defines shared fixtures for the pytest test suite.
 """
 
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 import pytest
 
 
@@ -283,3 +288,57 @@ def example_failure_html():
         }
     }
     return steam_failure
+
+
+@pytest.fixture
+def steam_stub_server():
+    """A pytest fixture that serves fake appdetails responses from a local HTTP server.
+    Each response takes 0.1s, and app ID 429 is rate limited on its first request.
+    The peak number of requests in flight at once is recorded under 'in_flight'."""
+    requests_seen = []
+    in_flight = {'now': 0, 'peak': 0}
+    in_flight_lock = threading.Lock()
+
+    class AppDetailsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with in_flight_lock:
+                in_flight['now'] += 1
+                in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+            try:
+                self.respond()
+            finally:
+                with in_flight_lock:
+                    in_flight['now'] -= 1
+
+        def respond(self):
+            app_id = parse_qs(urlparse(self.path).query)['appids'][0]
+            requests_seen.append(app_id)
+            time.sleep(0.1)
+            if app_id == '429' and requests_seen.count(app_id) == 1:
+                self.send_response(429)
+                self.end_headers()
+                return
+            body = json.dumps({app_id: {'success': True, 'data': {
+                'name': f'Game {app_id}',
+                'price_overview': {'final': int(app_id), 'currency': 'GBP'}
+            }}}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class StubServer(ThreadingHTTPServer):
+        request_queue_size = 64
+
+    server = StubServer(('127.0.0.1', 0), AppDetailsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield {'url': f'http://127.0.0.1:{server.server_port}/api/appdetails',
+           'requests': requests_seen,
+           'in_flight': in_flight}
+    server.shutdown()
+    server.server_close()
@@ -3,40 +3,62 @@
 This module tests functions used during the extraction of steam data via scraping and the api
 """
 
-from src.elt_pipeline.steam_el.extract import get_existing_games, get_steam_game_details, parse_games_bs, iterate_through_scraped_games
+from src.elt_pipeline.steam_el.extract import get_existing_games, get_steam_game_details, parse_games_bs, iterate_through_scraped_games, TokenBucket, crawl_search_results, STEAM_SEARCH_URL, SEARCH_PAGE_SIZE
+import src.elt_pipeline.steam_el.extract as steam_extract
+import http_client
 from unittest.mock import patch
 import requests_mock
 import pandas as pd
 import awswrangler as wr
 import requests as req
+import pytest
+from bs4 import BeautifulSoup
+import html_parser
 
 
 @patch('awswrangler.s3.read_parquet')
 def test_get_existing_games_success(mock_read_parquet):
     """
-    Tests get_existing_games returns correct dataframe on success.
+    Tests get_existing_games returns the app IDs in the store's index as strings.
     """
     mock_df = pd.DataFrame({'app_id': [100, 101]})
     mock_read_parquet.return_value = mock_df
-    expected_list = ['100', '101']
+    expected_set = {'100', '101'}
 
-    result = get_existing_games("s3://fake-bucket/input/", None)
+    result = get_existing_games("s3://fake-bucket/input/steam", None)
 
-    assert result == expected_list
+    assert result == expected_set
     mock_read_parquet.assert_called_once()
+    assert mock_read_parquet.call_args.args[0] == "s3://fake-bucket/index/steam/app_ids.parquet"
 
 
+@patch('awswrangler.s3.to_parquet')
 @patch('awswrangler.s3.read_parquet')
-def test_get_existing_games_failure(mock_read_parquet):
+def test_get_existing_games_empty_store(mock_read_parquet, mock_to_parquet):
     """
-    Tests get_existing_games returns empty dataframe on failure.
+    Tests get_existing_games returns an empty set when the store has no data yet.
     """
-    mock_read_parquet.side_effect = Exception("No files found")
+    mock_read_parquet.side_effect = wr.exceptions.NoFilesFound("No files found")
 
-    result = get_existing_games("s3://fake-bucket/input/", None)
+    result = get_existing_games("s3://fake-bucket/input/steam", None)
 
-    assert result == []
-    mock_read_parquet.assert_called_once()
+    assert result == set()
+    assert mock_read_parquet.call_count == 2
+    mock_to_parquet.assert_not_called()
+
+
+@patch('awswrangler.s3.to_parquet')
+@patch('awswrangler.s3.read_parquet')
+def test_get_existing_games_failure(mock_read_parquet, mock_to_parquet):
+    """
+    Tests get_existing_games raises read errors rather than returning an empty set,
+    which would be written back over the index.
+    """
+    mock_read_parquet.side_effect = Exception("AccessDenied")
+
+    with pytest.raises(Exception, match="AccessDenied"):
+        get_existing_games("s3://fake-bucket/input/steam", None)
+    mock_to_parquet.assert_not_called()
 
 
 def test_parse_games_bs_valid_data(example_two_games_html):
@@ -61,6 +83,19 @@ def test_parse_games_bs_valid_data(example_two_games_html):
     assert game2['url'] == 'https://store.steampowered.com/app/730/CS2/'
 
 
+@pytest.mark.parametrize('parser', ['html.parser', 'lxml'])
+def test_parse_games_bs_matches_full_page_parse(example_two_games_html, parser):
+    """
+    Tests parse_games_bs gives the same games parsing only links as parsing the whole page.
+    """
+    with patch.object(steam_extract, 'make_soup',
+                      lambda html, only=None: BeautifulSoup(html, 'html.parser')):
+        expected = parse_games_bs(example_two_games_html)
+
+    with patch.object(html_parser, 'HTML_PARSER', parser):
+        assert parse_games_bs(example_two_games_html) == expected
+
+
 def test_parse_games_bs_empty_html():
     """
     Tests parse_games_bs returns an empty list when passed an empty html.
@@ -188,3 +223,104 @@ def test_iterate_skips_items_no_app_id(mock_get_details):
     mock_get_details.assert_any_call(10)
 
     assert len(result) == 1
+
+
+def test_iterate_through_scraped_games_concurrent_keeps_order(steam_stub_server, monkeypatch):
+    """
+    Tests iterate_through_scraped_games fetches games concurrently from a stub server
+    and returns them in the scraped order.
+    """
+    monkeypatch.setattr(steam_extract, 'STEAM_APPDETAILS_URL',
+                        steam_stub_server['url'])
+    monkeypatch.setattr(steam_extract, 'STEAM_RATE_LIMITER',
+                        TokenBucket(100, 1))
+    game_list = [{'app_id': str(app_id)} for app_id in range(100, 120)]
+
+    result = iterate_through_scraped_games(game_list, max_workers=10)
+
+    assert 1 < steam_stub_server['in_flight']['peak'] <= 10
+    assert [game['app_id'] for game in result] == [
+        str(app_id) for app_id in range(100, 120)]
+    assert [game['price'] for game in result] == list(range(100, 120))
+
+
+def test_get_steam_game_details_retries_rate_limited_requests(steam_stub_server, monkeypatch):
+    """
+    Tests get_steam_game_details retries a 429 response and returns the data.
+    """
+    monkeypatch.setattr(steam_extract, 'STEAM_APPDETAILS_URL',
+                        steam_stub_server['url'])
+    monkeypatch.setattr(http_client, 'BACKOFF_SECONDS', 0.01)
+
+    result = get_steam_game_details('429')
+
+    assert steam_stub_server['requests'] == ['429', '429']
+    assert result['price'] == 429
+
+
+class FakeClock:
+    """Stands in for the time module, advancing only when slept on"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_limits_rate(monkeypatch):
+    """
+    Tests TokenBucket allows a burst up to its capacity and then waits for refills.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(http_client, 'time', clock)
+    bucket = TokenBucket(5, 0.5)
+
+    for _ in range(10):
+        bucket.acquire()
+
+    # The first 5 are a burst, then each waits a tenth of a second for a token
+    assert clock.sleeps == [pytest.approx(0.1)] * 5
+    assert clock.now == pytest.approx(0.5)
+
+
+def search_page(app_ids):
+    return {'success': 1, 'results_html': ''.join(
+        f'<a href="https://store.steampowered.com/app/{app_id}/Game_{app_id}/" '
+        f'data-ds-appid="{app_id}"><span class="title">Game {app_id}</span>'
+        f'<div class="col search_released responsive_secondrow">Jan 1, 2025</div></a>'
+        for app_id in app_ids)}
+
+
+def test_crawl_search_results_stops_at_known_page(requests_mock):
+    """
+    Tests crawl_search_results walks search pages until a page of known games.
+    """
+    for page, app_ids in enumerate([['1', '2'], ['3', '4'], ['5', '6'], ['7']]):
+        requests_mock.get(f'{STEAM_SEARCH_URL}?start={page * SEARCH_PAGE_SIZE}',
+                          json=search_page(app_ids))
+
+    result = crawl_search_results({'4', '5', '6'}, max_pages=4)
+
+    assert [game['app_id'] for game in result] == ['1', '2', '3', '4']
+    assert result[0]['title'] == 'Game 1'
+    requested_starts = {request.qs['start'][0]
+                        for request in requests_mock.request_history}
+    assert requested_starts == {'0', str(SEARCH_PAGE_SIZE), str(2 * SEARCH_PAGE_SIZE)}
+
+
+def test_crawl_search_results_respects_max_pages(requests_mock):
+    """
+    Tests crawl_search_results stops after max_pages when every game is new.
+    """
+    requests_mock.get(STEAM_SEARCH_URL, json=search_page(['1']))
+
+    result = crawl_search_results(set(), max_pages=2)
+
+    assert len(result) == 2
+    assert requests_mock.call_count == 2
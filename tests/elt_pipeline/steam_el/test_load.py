@@ -2,7 +2,8 @@
 import pytest
 import pandas as pd
 from unittest.mock import patch
-from src.elt_pipeline.steam_el.load import get_session, add_time_partitioning, upload_to_s3
+from src.elt_pipeline.steam_el.load import (get_session, add_time_partitioning, upload_to_s3,
+                                            conform_to_schema, COLUMN_TYPES)
 
 # Sample input data
 SAMPLE_DATA = [
@@ -54,6 +55,17 @@ def test_add_time_partitioning():
     assert df["day"].iloc[0] == 28
 
 
+@patch("src.elt_pipeline.steam_el.load.get_ingest_date", return_value="2025-07-30")
+def test_add_time_partitioning_adds_ingest_date(mock_ingest_date):
+    '''Tests that every row is tagged with the day it was ingested,
+    whatever its release date.'''
+    df = add_time_partitioning(SAMPLE_DATA + [{"url": "url3", "title": "title3",
+                                               "release": "Coming soon"}])
+
+    assert list(df["ingest_date"]) == ["2025-07-30"] * 3
+    assert df["year"].iloc[2] == 1900
+
+
 @patch("src.elt_pipeline.steam_el.load.wr.s3.to_parquet")
 def test_upload_to_s3_calls_wrangler(mock_to_parquet):
     '''Test that upload_to_s3 calls awswrangler's to_parquet method with correct parameters.
@@ -67,4 +79,24 @@ def test_upload_to_s3_calls_wrangler(mock_to_parquet):
 
     assert kwargs["dataset"] is True
     assert kwargs["mode"] == "append"
-    assert "day" in kwargs["partition_cols"]
+    assert kwargs["partition_cols"] == ["ingest_date", "year", "month", "day"]
+
+
+def test_conform_to_schema_adds_missing_columns():
+    '''Tests that games missing declared columns, such as those whose details
+    failed to download, still get every column, as nulls.'''
+    df = conform_to_schema(add_time_partitioning(SAMPLE_DATA))
+
+    assert set(COLUMN_TYPES) <= set(df.columns)
+    assert df["genres"].isna().all()
+
+
+@patch("src.elt_pipeline.steam_el.load.wr.s3.to_parquet")
+def test_upload_to_s3_declares_schema(mock_to_parquet):
+    '''Test that the upload declares each column's type,
+    rather than leaving awswrangler to infer them.'''
+    upload_to_s3(add_time_partitioning(SAMPLE_DATA), True)
+
+    kwargs = mock_to_parquet.call_args.kwargs
+    assert kwargs["dtype"]["requirements"] == "struct<minimum:string,recommended:string>"
+    assert kwargs["dtype"]["genres"] == "array<string>"
@@ -0,0 +1,82 @@
+# pylint: skip-file
+"""
+Micro-benchmark comparing the old row-by-row assignment table builder
+with the columnar explode/merge builder in get_assignment_dfs.
+
+Database lookups are replaced by an in-memory name to ID map so only the
+pandas work is timed. Run from the root of the repo with:
+`python -m tests.elt_pipeline.tl.benchmark_assignment`
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+import pandas as pd
+
+# The TL module imports shared modules that sit next to its handler in the image
+sys.path.insert(0, str(Path(__file__).parents[3] / 'src/elt_pipeline/common'))
+
+from src.elt_pipeline.tl.transform_and_load_to_rds import get_assignment_dfs
+
+REFERENCE_TABLES = ['genre', 'publisher', 'developer']
+GAME_COUNTS = [1_000, 10_000, 100_000]
+
+
+def make_games(count: int) -> tuple[pd.DataFrame, dict[str:int]]:
+    """Returns fake games with one to three names per reference table"""
+    rng = random.Random(count)
+    pools = {table: [f"{table} {i}" for i in range(count // 10 + 20)]
+             for table in REFERENCE_TABLES}
+    games = pd.DataFrame({'game_id': range(1, count + 1)})
+    for table in REFERENCE_TABLES:
+        games[table + 's'] = [rng.sample(pools[table], rng.randint(1, 3))
+                              for _ in range(count)]
+    name_to_id = {name: i for names in pools.values()
+                  for i, name in enumerate(names, start=1)}
+    return games, name_to_id
+
+
+def row_by_row(games: pd.DataFrame, name_to_id: dict[str:int]) -> dict[str:pd.DataFrame]:
+    """The previous builder, walking each row as a dict"""
+    columns = list(games.columns)
+    tables = {}
+    for table in REFERENCE_TABLES:
+        rows = []
+        for row in games.itertuples(index=False):
+            row = {columns[i]: row[i] for i in range(len(columns))}
+            for item in row[table + 's']:
+                rows.append({'game_id': row['game_id'],
+                             table + '_id': name_to_id[item]})
+        tables[table + '_assignment'] = pd.DataFrame(rows)
+    return tables
+
+
+def columnar(games: pd.DataFrame) -> dict[str:pd.DataFrame]:
+    """The explode/merge builder"""
+    return get_assignment_dfs(games, 'game', REFERENCE_TABLES, MagicMock(), {})
+
+
+def main():
+    """Times both builders at each game count and prints the speedup"""
+    print(f"{'games':>8} {'row by row (s)':>15} {'columnar (s)':>13} {'speedup':>8}")
+    for count in GAME_COUNTS:
+        games, name_to_id = make_games(count)
+        with patch('src.elt_pipeline.tl.transform_and_load_to_rds.upsert_reference_names',
+                   side_effect=lambda conn, table, names: {
+                       name: name_to_id[name] for name in names}):
+            expected = row_by_row(games, name_to_id)
+            result = columnar(games)
+            for table, df in expected.items():
+                assert df.equals(result[table]), table
+
+            repeats = 3
+            old = min(timeit.repeat(lambda: row_by_row(games, name_to_id),
+                                    number=1, repeat=repeats))
+            new = min(timeit.repeat(lambda: columnar(games),
+                                    number=1, repeat=repeats))
+        print(f"{count:>8} {old:>15.3f} {new:>13.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
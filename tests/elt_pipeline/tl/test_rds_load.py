@@ -1,7 +1,9 @@
 # pylint: skip-file
 
+from datetime import date
 from pathlib import Path
 import pandas as pd
+import pytest
 from sqlalchemy import create_engine, text
 from unittest.mock import MagicMock, patch
 import src.elt_pipeline.tl.transform_and_load_to_rds as loader
@@ -21,21 +23,6 @@ games_df = pd.DataFrame({
     "game_url": ["steam.com"]
 })
 
-publisher_df = pd.DataFrame({
-    "publisher_id": [1],
-    "publisher_name": ["Publisher A"]
-})
-
-developer_df = pd.DataFrame({
-    "developer_id": [1],
-    "developer_name": ["Developer A"]
-})
-
-genre_df = pd.DataFrame({
-    "genre_id": [1],
-    "genre_name": ["Genre A"]
-})
-
 genre_assignment_df = pd.DataFrame({
     "genre_id": [1],
     "game_id": [123]
@@ -57,19 +44,6 @@ assignment_df = pd.DataFrame({
 })
 
 
-def test_upload_table_calls_execute_with_correct_sql():
-    conn = MagicMock()
-    df = pd.DataFrame({"publisher_id": [1], "publisher_name": ["Pub1"]})
-    loader.upload_table(conn, df, "publisher",
-                        "publisher_name")
-
-    assert conn.execute.call_count == len(df)
-    args, kwargs = conn.execute.call_args
-    params = args[1]
-    assert "INSERT INTO publisher" in str(args[0])
-    assert params["name"] == "Pub1"
-
-
 def test_upload_games_executes_correctly():
     conn = MagicMock()
     loader.upload_games(conn, games_df)
@@ -83,6 +57,32 @@ def test_upload_games_executes_correctly():
     assert params["price"] == 1999
 
 
+def test_upload_games_bulk_copies_then_merges():
+    conn = MagicMock()
+    conn.execute.return_value.rowcount = 1
+    cursor = conn.connection.cursor.return_value
+    two_games_df = pd.concat([games_df, games_df.assign(app_id=456)])
+
+    result = loader.upload_games_bulk(conn, two_games_df)
+
+    copy_sql, buffer = cursor.copy_expert.call_args[0]
+    assert "COPY pg_temp.game_staging" in copy_sql
+    assert "DROP TABLE IF EXISTS pg_temp.game_staging" in str(conn.execute.call_args_list[0][0][0])
+    assert buffer.getvalue().count("Description A") == 2
+    merge_sql = str(conn.execute.call_args[0][0])
+    assert "INSERT INTO game" in merge_sql
+    assert "ON CONFLICT (app_id) DO NOTHING" in merge_sql
+    assert result == {'inserted': 1, 'skipped': 1}
+
+
+def test_to_copy_csv_quotes_values_and_leaves_nulls_bare():
+    df = pd.DataFrame({"game_description": ['Says "hi"', None, "\\N"],
+                       "price": [1999, 0, 5]})
+
+    assert loader.to_copy_csv(df).getvalue() == (
+        '"Says ""hi""","1999"\n,"0"\n"\\N","5"\n')
+
+
 def test_upload_assignments_executes_correctly():
     conn = MagicMock()
     loader.upload_assignments(conn, assignment_df,
@@ -111,7 +111,7 @@ def test_load_data_into_database_calls_all_uploads(mock_transform, mock_get_engi
     mock_get_engine.return_value = mock_engine
 
     loader.load_data_into_database(
-        mock_conn, games_df, publisher_df, developer_df, genre_df, genre_assignment_df, developer_assignment_df, publisher_assignment_df)
+        mock_conn, games_df, genre_assignment_df, developer_assignment_df, publisher_assignment_df)
 
     assert mock_conn.execute.call_count > 0
 
@@ -122,3 +122,253 @@ def test_get_engine_returns_engine_instance():
     from sqlalchemy.engine import Engine
 
     assert isinstance(engine, Engine)
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.read_compaction_manifests", return_value={})
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.wr.s3.list_objects")
+def test_get_unprocessed_objects_skips_processed_keys(mock_list_objects, mock_manifest):
+    mock_list_objects.return_value = ["s3://b/input/steam/a.parquet",
+                                      "s3://b/input/steam/b.parquet"]
+    conn = MagicMock()
+    conn.execute.return_value = [("s3://b/input/steam/b.parquet",)]
+
+    result = loader.get_unprocessed_objects(conn, loader.stores[0])
+
+    assert result == ["s3://b/input/steam/b.parquet"]
+    assert mock_list_objects.call_args[0][0].endswith("input/steam/")
+    assert "processed_s3_object" in str(conn.execute.call_args[0][0])
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.read_compaction_manifests", return_value={})
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.wr.s3.list_objects")
+def test_get_unprocessed_objects_full_rescan(mock_list_objects, mock_manifest):
+    mock_list_objects.return_value = ["s3://b/input/steam/a.parquet"]
+    conn = MagicMock()
+
+    result = loader.get_unprocessed_objects(
+        conn, loader.stores[0], full_rescan=True)
+
+    assert result == ["s3://b/input/steam/a.parquet"]
+    conn.execute.assert_not_called()
+
+
+def test_get_window_partitions_lists_ingest_days():
+    result = loader.get_window_partitions(
+        "s3://b/input/steam/", 2, today=date(2024, 3, 1))
+
+    assert result == ["s3://b/input/steam/ingest_date=2024-02-28/",
+                      "s3://b/input/steam/ingest_date=2024-02-29/",
+                      "s3://b/input/steam/ingest_date=2024-03-01/"]
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.read_compaction_manifests", return_value={})
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.wr.s3.list_objects")
+def test_get_unprocessed_objects_lists_only_window_partitions(mock_list_objects, mock_manifest):
+    mock_list_objects.side_effect = lambda prefix, suffix: [prefix + "a.parquet"]
+    conn = MagicMock()
+
+    result = loader.get_unprocessed_objects(
+        conn, loader.stores[0], full_rescan=True, window_days=2)
+
+    listed = [call.args[0] for call in mock_list_objects.call_args_list]
+    assert len(listed) == 3
+    assert all("/input/steam/ingest_date=" in prefix for prefix in listed)
+    assert result == [prefix + "a.parquet" for prefix in listed]
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.read_compaction_manifests", return_value={})
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.wr.s3.list_objects")
+def test_get_unprocessed_objects_lists_one_ingest_date(mock_list_objects, mock_manifest):
+    mock_list_objects.return_value = []
+    conn = MagicMock()
+
+    loader.get_unprocessed_objects(conn, loader.stores[0], window_days=2,
+                                   ingest_date="2024-03-01")
+
+    mock_list_objects.assert_called_once_with(
+        "s3://c18-game-tracker-s3/input/steam/ingest_date=2024-03-01/",
+        suffix=".parquet")
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.transform_s3_steam_data")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.mark_objects_processed")
+def test_process_store_full_scan_ignores_window(mock_mark, mock_transform):
+    mock_transform.return_value = {"game": pd.DataFrame(), "s3_objects": []}
+    engine = MagicMock()
+
+    loader.process_store(engine, loader.stores[0],
+                         loader.get_run_options({}), {})
+    loader.process_store(engine, loader.stores[0],
+                         loader.get_run_options({"full_scan": True}), {})
+
+    windows = [call.args[4] for call in mock_transform.call_args_list]
+    assert windows == [loader.DEFAULT_WINDOW_DAYS, None]
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.read_compaction_manifests")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.wr.s3.list_objects")
+def test_get_unprocessed_objects_skips_compactions_of_processed_objects(mock_list_objects, mock_manifest):
+    prefix = "s3://b/input/steam/year=2024/month=3/day=20/"
+    mock_manifest.return_value = {
+        prefix + "compacted-1.parquet": [prefix + "a.parquet", prefix + "b.parquet"],
+        prefix + "compacted-2.parquet": [prefix + "compacted-1.parquet", prefix + "c.parquet"],
+        prefix + "compacted-3.parquet": [prefix + "d.parquet"]}
+    mock_list_objects.return_value = [
+        prefix + "b.parquet", prefix + "compacted-2.parquet",
+        prefix + "compacted-3.parquet", prefix + "compacted-4.parquet",
+        prefix + "e.parquet"]
+    conn = MagicMock()
+    conn.execute.side_effect = [
+        # listed objects not yet processed
+        [(prefix + "compacted-2.parquet",), (prefix + "compacted-3.parquet",),
+         (prefix + "e.parquet",)],
+        # sources of the unprocessed compactions that were processed
+        [(prefix + "a.parquet",), (prefix + "b.parquet",), (prefix + "c.parquet",)],
+        # marking compacted-2 as processed
+        None]
+
+    result = loader.get_unprocessed_objects(conn, loader.stores[0])
+
+    assert result == [prefix + "compacted-3.parquet", prefix + "e.parquet"]
+    listed = conn.execute.call_args_list[0][0][1]["object_keys"]
+    assert listed == [prefix + "compacted-2.parquet", prefix + "compacted-3.parquet",
+                      prefix + "e.parquet"]
+    marked = conn.execute.call_args_list[2][0][1]["object_keys"]
+    assert marked == [prefix + "compacted-2.parquet"]
+
+
+def test_mark_objects_processed_records_keys():
+    conn = MagicMock()
+    loader.mark_objects_processed(conn, 1, ["s3://b/input/steam/a.parquet"])
+
+    args, kwargs = conn.execute.call_args
+    assert "INSERT INTO processed_s3_object" in str(args[0])
+    assert args[1] == {"store_id": 1,
+                       "object_keys": ["s3://b/input/steam/a.parquet"]}
+
+
+def test_get_new_app_ids_sends_candidates_to_database():
+    conn = MagicMock()
+    conn.execute.return_value = [("456",)]
+
+    result = loader.get_new_app_ids(conn, ["123", "456"])
+
+    args, kwargs = conn.execute.call_args
+    assert "NOT EXISTS" in str(args[0])
+    assert args[1] == {"app_ids": ["123", "456"]}
+    assert result == {"456"}
+
+
+def test_get_new_app_ids_skips_query_without_candidates():
+    conn = MagicMock()
+
+    assert loader.get_new_app_ids(conn, []) == set()
+    conn.execute.assert_not_called()
+
+
+def test_read_db_table_into_df_projects_and_filters():
+    conn = MagicMock()
+    result = conn.execute.return_value
+    result.keys.return_value = ["genre_name", "genre_id"]
+    result.fetchall.return_value = [("Action", 1), ("RPG", 2), ("Indie", 3)]
+
+    df = loader.read_db_table_into_df(
+        "genre", conn, ["genre_name", "genre_id"], "genre_id > :min_id", {"min_id": 0})
+
+    query, params = conn.execute.call_args[0]
+    assert str(query) == "SELECT genre_name, genre_id FROM genre WHERE genre_id > :min_id"
+    assert params == {"min_id": 0}
+    assert list(df["genre_name"]) == ["Action", "RPG", "Indie"]
+    assert list(df.columns) == ["genre_name", "genre_id"]
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.get_engine")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.process_store")
+def test_main_concurrent_processes_every_store(mock_process_store, mock_get_engine):
+    options = loader.get_run_options({"concurrent": True})
+
+    loader.main(options)
+
+    processed = {call.args[1]["store_name"]
+                 for call in mock_process_store.call_args_list}
+    assert processed == {"steam", "epic", "gog"}
+    id_caches = [call.args[3] for call in mock_process_store.call_args_list]
+    assert len({id(cache) for cache in id_caches}) == 3
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.get_engine")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.process_store")
+def test_main_sequential_shares_id_cache(mock_process_store, mock_get_engine):
+    loader.main()
+
+    stores = [call.args[1]["store_name"]
+              for call in mock_process_store.call_args_list]
+    assert stores == ["steam", "epic", "gog"]
+    id_caches = [call.args[3] for call in mock_process_store.call_args_list]
+    assert len({id(cache) for cache in id_caches}) == 1
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.mark_objects_processed")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.load_transformed_data")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.transform_raw_data")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.wr.s3.read_parquet")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.get_unprocessed_objects")
+def test_process_store_in_batches_loads_each_batch_in_a_savepoint(
+        mock_objects, mock_read_parquet, mock_transform, mock_load, mock_mark):
+    mock_objects.return_value = ["s3://b/input/steam/a.parquet"]
+    batches = [pd.DataFrame({"app_id": ["1", "2"]}), pd.DataFrame({"app_id": ["3"]})]
+    mock_read_parquet.return_value = iter(batches)
+    conn = MagicMock()
+    known_ids = {}
+    options = loader.get_run_options({"chunk_size": 2})
+
+    loader.process_store_in_batches(conn, loader.stores[0], options, known_ids, 2)
+
+    assert mock_read_parquet.call_args.kwargs["chunked"] == 2
+    assert [call.args[2] for call in mock_transform.call_args_list] == batches
+    assert all(call.args[3] is known_ids for call in mock_transform.call_args_list)
+    assert conn.begin_nested.call_count == 2
+    mock_mark.assert_called_once_with(
+        conn, loader.stores[0]["store_id"], ["s3://b/input/steam/a.parquet"])
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.mark_objects_processed")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.load_transformed_data")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.transform_raw_data")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.wr.s3.read_parquet")
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.get_unprocessed_objects")
+def test_process_store_in_batches_failed_batch_leaves_objects_unprocessed(
+        mock_objects, mock_read_parquet, mock_transform, mock_load, mock_mark):
+    mock_objects.return_value = ["s3://b/input/steam/a.parquet"]
+    mock_read_parquet.return_value = iter([pd.DataFrame({"app_id": ["1"]}),
+                                           pd.DataFrame({"app_id": ["2"]})])
+
+    def resolve_then_fail(conn, store, raw_df, known_ids):
+        known_ids.setdefault("genre", {})[raw_df["app_id"][0]] = 1
+        if raw_df["app_id"][0] == "2":
+            raise ValueError("bad batch")
+
+    mock_transform.side_effect = resolve_then_fail
+    known_ids = {}
+
+    error = loader.process_store_in_batches(MagicMock(), loader.stores[0],
+                                            loader.get_run_options({"chunk_size": 1}),
+                                            known_ids, 2)
+
+    assert str(error) == "bad batch"
+    assert mock_load.call_count == 1
+    # Both batches' IDs were committed when resolved, so the cache keeps them
+    assert known_ids == {"genre": {"1": 1, "2": 1}}
+    mock_mark.assert_not_called()
+
+
+@patch("src.elt_pipeline.tl.transform_and_load_to_rds.process_store_in_batches")
+def test_process_store_raises_failed_batch_after_commit(mock_batches):
+    mock_batches.return_value = ValueError("bad batch")
+    engine = MagicMock()
+    conn = engine.connect.return_value.__enter__.return_value
+
+    with pytest.raises(ValueError, match="bad batch"):
+        loader.process_store(engine, loader.stores[0],
+                             loader.get_run_options({"chunk_size": 1}), {})
+    conn.begin.return_value.__exit__.assert_called_once_with(None, None, None)
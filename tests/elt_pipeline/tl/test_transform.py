@@ -3,7 +3,7 @@
 import pandas as pd
 import pytest
 from unittest.mock import MagicMock, patch
-from src.elt_pipeline.tl.transform_and_load_to_rds import get_assignment_df, process_data, extract_memory_requirements, get_reference_data
+from src.elt_pipeline.tl.transform_and_load_to_rds import get_assignment_df, process_data, extract_memory_requirements, resolve_reference_ids, get_assignment_dfs
 
 get_assignment_df_test_data = [(
     pd.DataFrame({
@@ -24,21 +24,79 @@ get_assignment_df_test_data = [(
 )]
 
 
-@patch('src.elt_pipeline.tl.transform_and_load_to_rds.get_or_create_id')
+@patch('src.elt_pipeline.tl.transform_and_load_to_rds.upsert_reference_names')
 @pytest.mark.parametrize(
     'main_df,reference_df,main_df_name,reference_df_name,assignment_df',
     get_assignment_df_test_data
 )
-def test_get_assignment_df(mock_get_or_create_id, main_df, reference_df, main_df_name, reference_df_name, assignment_df):
+def test_get_assignment_df(mock_upsert_reference_names, main_df, reference_df, main_df_name, reference_df_name, assignment_df):
     """Tests whether get_assignment_df correctly generates an assignment table"""
     name_to_id = {'Tennis': 1, 'Chess': 2, 'Knitting': 3}
-    mock_get_or_create_id.side_effect = lambda conn, table, name_col, name_val, id_col: name_to_id[
-        name_val]
+    mock_upsert_reference_names.side_effect = lambda conn, table, names: {
+        name: name_to_id[name] for name in names}
     conn = MagicMock()
     result = get_assignment_df(
         main_df, main_df_name, reference_df_name, conn)
 
     assert result.equals(assignment_df)
+    mock_upsert_reference_names.assert_called_once_with(
+        conn.engine.begin.return_value.__enter__.return_value,
+        'club', ['Chess', 'Knitting', 'Tennis'])
+
+
+@patch('src.elt_pipeline.tl.transform_and_load_to_rds.upsert_reference_names')
+def test_resolve_reference_ids_only_fetches_unseen_names(mock_upsert_reference_names):
+    """Tests whether resolve_reference_ids reuses IDs resolved earlier in the run"""
+    mock_upsert_reference_names.return_value = {'Knitting': 3}
+    known_ids = {'club': {'Tennis': 1, 'Chess': 2}}
+
+    result = resolve_reference_ids(
+        MagicMock(), 'club', ['Chess', 'Knitting'], known_ids)
+
+    assert result == {'Tennis': 1, 'Chess': 2, 'Knitting': 3}
+    assert known_ids['club'] is result
+    assert mock_upsert_reference_names.call_args[0][2] == ['Knitting']
+
+    resolve_reference_ids(MagicMock(), 'club', ['Knitting'], known_ids)
+    assert mock_upsert_reference_names.call_count == 1
+
+
+@patch('src.elt_pipeline.tl.transform_and_load_to_rds.upsert_reference_names')
+def test_resolve_reference_ids_commits_names_separately(mock_upsert_reference_names):
+    """Tests whether new names are upserted in their own committed transaction"""
+    mock_upsert_reference_names.return_value = {'Knitting': 3}
+    conn = MagicMock()
+
+    resolve_reference_ids(conn, 'club', ['Knitting'])
+
+    conn.engine.begin.assert_called_once_with()
+    conn.engine.begin.return_value.__exit__.assert_called_once()
+    conn.execute.assert_not_called()
+
+
+@patch('src.elt_pipeline.tl.transform_and_load_to_rds.upsert_reference_names')
+def test_get_assignment_dfs_builds_every_table(mock_upsert_reference_names):
+    """Tests whether get_assignment_dfs builds each assignment table in one pass"""
+    name_to_id = {'Tennis': 1, 'Chess': 2, 'Knitting': 3, 'Anna': 1, 'Bob': 2}
+    mock_upsert_reference_names.side_effect = lambda conn, table, names: {
+        name: name_to_id[name] for name in names}
+    main_df = pd.DataFrame({
+        'friend_id': [1, 2, 3],
+        'clubs': [['Tennis', 'Chess'], ['Knitting'], []],
+        'coachs': [['Bob'], None, ['Anna', 'Bob']]
+    })
+
+    result = get_assignment_dfs(
+        main_df, 'friend', ['club', 'coach'], MagicMock())
+
+    assert result['club_assignment'].equals(pd.DataFrame({
+        'friend_id': [1, 1, 2],
+        'club_id': [1, 2, 3]
+    }))
+    assert result['coach_assignment'].equals(pd.DataFrame({
+        'friend_id': [1, 3, 3],
+        'coach_id': [2, 1, 2]
+    }))
 
 
 process_data_test_data = [
@@ -91,35 +149,3 @@ def test_extract_memory_requirements(requirements, memory_requirements):
     """Tests whether extract_memory_requirements correctly reads memory requirements"""
     assert extract_memory_requirements(
         requirements) == memory_requirements
-
-
-get_reference_data_test_data = [(
-    pd.DataFrame({
-        'friend_id': [1, 2],
-        'friend_name': ['Hugo', 'Susan'],
-        'clubs': [['Tennis', 'Chess'], ['Chess', 'Knitting']]
-    }),
-    pd.DataFrame({
-        'club_name': ['Tennis'],
-        'club_id': [1]
-    }),
-    'club'
-)]
-
-
-@pytest.mark.parametrize(
-    'main_df,reference_df,reference_df_name',
-    get_reference_data_test_data
-)
-def test_get_reference_data(main_df, reference_df, reference_df_name):
-    """Tests whether get_reference_data correctly generates a secondary table"""
-    reference_table = get_reference_data(main_df, reference_df,
-                                         reference_df_name)
-    assert set(reference_table['all']['club_name']) == {
-        'Tennis', 'Chess', 'Knitting'}
-    assert set(reference_table['all']['club_id']) == {
-        1, 2, 3}
-    assert set(reference_table['new']['club_name']) == {
-        'Chess', 'Knitting'}
-    assert set(reference_table['new']['club_id']) == {
-        2, 3}